@@ -0,0 +1,257 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import sys
+import json
+import time
+import shutil
+import tarfile
+import zipfile
+import yaml
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+import SocketServer
+import SimpleHTTPServer
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_PATH)
+
+from lib.logger import LOGGER
+
+PACK_SH_TEMPLATE = '''#!/bin/sh
+set -e
+python - <<EOF
+import os, zipfile
+with open('payload.bin', 'wb') as payload:
+    for i in range({payload_mb}):
+        payload.write(os.urandom(1024 * 1024))
+package = zipfile.ZipFile('{name}-1.0.zip', 'w', zipfile.ZIP_DEFLATED)
+package.write('payload.bin')
+package.write('manifest.yml')
+package.close()
+EOF
+'''
+
+ATK_VERSIONS_CATALOG = {'latest': {'release': 1}}
+
+
+class _FileHandler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+    root_path = None
+
+    def translate_path(self, path):
+        path = SimpleHTTPServer.SimpleHTTPRequestHandler.translate_path(self, path)
+        return os.path.join(self.root_path, os.path.relpath(path, os.getcwd()))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_file_server(root_path):
+    class FileHandler(_FileHandler):
+        pass
+    FileHandler.root_path = root_path
+    server = _ThreadingHTTPServer(('127.0.0.1', 0), FileHandler)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+
+def _git(args, cwd):
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(['git'] + args, cwd=cwd, stdout=devnull, stderr=devnull)
+
+
+def create_universal_repo(repos_path, name, payload_mb):
+    repo_path = os.path.join(repos_path, name)
+    os.makedirs(repo_path)
+    with open(os.path.join(repo_path, 'pack.sh'), 'w') as pack_sh:
+        pack_sh.write(PACK_SH_TEMPLATE.format(name=name, payload_mb=payload_mb))
+    with open(os.path.join(repo_path, 'manifest.yml'), 'w') as manifest:
+        manifest.write('---\napplications:\n- name: {}\n'.format(name))
+    _commit_all(repo_path)
+
+
+def create_tool_repo(repos_path, name, files_count):
+    repo_path = os.path.join(repos_path, name)
+    os.makedirs(os.path.join(repo_path, 'src'))
+    for i in range(files_count):
+        with open(os.path.join(repo_path, 'src', 'module_{}.py'.format(i)), 'w') as module:
+            module.write('# generated module {}\n'.format(i) * 200)
+    _commit_all(repo_path)
+
+
+def _commit_all(repo_path):
+    _git(['init', '-q'], repo_path)
+    _git(['checkout', '-q', '-b', 'master'], repo_path)
+    _git(['add', '-A'], repo_path)
+    _git(['-c', 'user.name=benchmark', '-c', 'user.email=benchmark@localhost', 'commit', '-q', '-m', 'init'], repo_path)
+
+
+def create_atk_files(http_root, tar_names, payload_mb):
+    binaries_path = os.path.join(http_root, 'atk', 'latest', 'binaries')
+    os.makedirs(binaries_path)
+    with open(os.path.join(http_root, 'atk', 'version.json'), 'w') as versions:
+        json.dump(ATK_VERSIONS_CATALOG, versions)
+    payload_path = os.path.join(http_root, 'payload.bin')
+    with open(payload_path, 'wb') as payload:
+        for i in range(payload_mb):
+            payload.write(os.urandom(1024 * 1024))
+    for tar_name in tar_names:
+        with tarfile.open(os.path.join(binaries_path, tar_name), 'w:gz') as tar:
+            tar.add(payload_path, 'lib/payload.bin')
+    os.remove(payload_path)
+
+
+def create_release_zip(http_root, name, payload_mb):
+    releases_path = os.path.join(http_root, 'releases')
+    if not os.path.exists(releases_path):
+        os.makedirs(releases_path)
+    with zipfile.ZipFile(os.path.join(releases_path, name + '.zip'), 'w') as release:
+        release.writestr('payload.bin', os.urandom(payload_mb * 1024 * 1024))
+
+
+def generate_workspace(work_path, args):
+    repos_path = os.path.join(work_path, 'repos')
+    http_root = os.path.join(work_path, 'http')
+    workspace_path = os.path.join(work_path, 'workspace')
+    for path in (repos_path, http_root, workspace_path):
+        os.makedirs(path)
+
+    applications = []
+    for i in range(args.apps):
+        name = 'app-{}'.format(i)
+        create_universal_repo(repos_path, name, args.payload_mb)
+        applications.append({'name': name, 'builder': 'universal'})
+    for i in range(args.tools):
+        name = 'tool-{}'.format(i)
+        create_tool_repo(repos_path, name, args.tool_files)
+        applications.append({'name': name, 'builder': 'tool'})
+    if args.atk:
+        create_atk_files(http_root, ['atk.tar.gz', 'se.tar.gz'], args.payload_mb)
+        applications.append({'name': 'atk', 'builder': 'atk', 'tar_name': 'atk.tar.gz'})
+        applications.append({'name': 'se', 'builder': 'atk', 'zip_name': 'se', 'tar_name': 'se.tar.gz'})
+    for i in range(args.releases):
+        name = 'release-{}'.format(i)
+        create_release_zip(http_root, name, args.payload_mb)
+        applications.append({'name': name, 'builder': 'release_downloader', 'snapshot': 'v1',
+                             'url': '<http>/releases/{}.zip'.format(name)})
+
+    shutil.copytree(os.path.join(REPO_PATH, 'utils'), os.path.join(workspace_path, 'utils'))
+    if args.atk:
+        for name in ('atk', 'se'):
+            if not os.path.exists(os.path.join(workspace_path, 'utils', name)):
+                shutil.copytree(os.path.join(REPO_PATH, 'utils', 'atk'), os.path.join(workspace_path, 'utils', name))
+    return repos_path, http_root, workspace_path, applications
+
+
+def write_cloud_apps(workspace_path, applications, http_url):
+    for app in applications:
+        if 'url' in app:
+            app['url'] = app['url'].replace('<http>', http_url)
+    with open(os.path.join(workspace_path, 'cloud_apps.yml'), 'w') as cloud_apps:
+        cloud_apps.write(yaml.safe_dump({'applications': applications}, default_flow_style=False))
+
+
+def run_build(workspace_path, repos_path, http_url, run_index, build_args):
+    destination_path = os.path.join(workspace_path, 'output')
+    trace_path = os.path.join(workspace_path, 'traces', str(run_index))
+    env = dict(os.environ)
+    env['TAP_REPOS_URL'] = 'file://' + repos_path + '/'
+    env['ATK_REPOS_URL'] = http_url + '/atk/'
+    command = [sys.executable, os.path.join(REPO_PATH, 'build_platform.py'), '-d', destination_path,
+               '--trace-dir', trace_path, '--skip-expand'] + build_args
+    with open(os.path.join(workspace_path, 'build-{}.log'.format(run_index)), 'w') as build_log:
+        start = time.time()
+        return_code = subprocess.call(command, cwd=workspace_path, env=env, stdout=build_log, stderr=build_log)
+        wall_time = time.time() - start
+    # Children are waited for one at a time, so this is the peak RSS of the biggest process so far
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    with open(os.path.join(trace_path, 'build-summary.json'), 'r') as summary_file:
+        summary = json.load(summary_file)
+    stages = {}
+    for app_summary in summary['apps'].itervalues():
+        for stage, duration in app_summary['stages'].iteritems():
+            stages[stage] = round(stages.get(stage, 0) + duration, 3)
+    return {'run': run_index, 'return_code': return_code, 'wall_time': round(wall_time, 3),
+            'peak_rss_mb': round(peak_rss_kb / 1024.0, 1), 'stages': stages,
+            'steps': dict((name, step['duration']) for name, step in summary['steps'].iteritems()),
+            'critical_path': [(span['app'], span['name'], span['duration']) for span in summary['critical_path']]}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Runs build_platform.py end-to-end against generated local '
+                                                 'repositories and HTTP server, without network access.')
+    parser.add_argument('-n', '--apps', type=int, default=10, help='Number of universal projects.')
+    parser.add_argument('--tools', type=int, default=2, help='Number of tool projects.')
+    parser.add_argument('--tool-files', type=int, default=200, help='Number of files in every tool project.')
+    parser.add_argument('--releases', type=int, default=1, help='Number of release_downloader projects.')
+    parser.add_argument('--atk', action='store_true', help='Add atk and se projects served by local HTTP server.')
+    parser.add_argument('--payload-mb', type=int, default=5, help='Size of generated payload in every package in MB.')
+    parser.add_argument('--runs', type=int, default=2, help='Number of consecutive runs in the same workspace.')
+    parser.add_argument('--work-dir', help='Directory for generated files, temporary directory by default.')
+    parser.add_argument('--keep', action='store_true', help='Do not remove generated files.')
+    parser.add_argument('-o', '--output', help='Path to JSON file for results.')
+    parser.add_argument('build_args', nargs=argparse.REMAINDER, help='Arguments passed to build_platform.py after --.')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    build_args = args.build_args[1:] if args.build_args[:1] == ['--'] else args.build_args
+    work_path = args.work_dir if args.work_dir else tempfile.mkdtemp(prefix='platform-parent-benchmark-')
+    server = None
+    try:
+        LOGGER.info('Generating benchmark workspace in %s', work_path)
+        repos_path, http_root, workspace_path, applications = generate_workspace(work_path, args)
+        server, http_url = start_file_server(http_root)
+        write_cloud_apps(workspace_path, applications, http_url)
+
+        results = []
+        for run_index in range(args.runs):
+            result = run_build(workspace_path, repos_path, http_url, run_index, build_args)
+            LOGGER.info('Run %s: %s in %.1fs, peak RSS %.1f MB', run_index,
+                        'succeeded' if result['return_code'] == 0 else 'failed', result['wall_time'], result['peak_rss_mb'])
+            for stage, duration in sorted(result['stages'].iteritems()):
+                LOGGER.info('  stage %-10s %8.1fs', stage, duration)
+            for step, duration in sorted(result['steps'].iteritems()):
+                LOGGER.info('  step  %-16s %8.1fs', step, duration)
+            results.append(result)
+
+        if args.output:
+            with open(args.output, 'w') as output:
+                json.dump({'apps': len(applications), 'payload_mb': args.payload_mb, 'build_args': build_args,
+                           'runs': results}, output, indent=2)
+        if any(result['return_code'] for result in results):
+            sys.exit(1)
+    finally:
+        if server:
+            server.shutdown()
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import json
+import argparse
+import urlparse
+import SocketServer
+import BaseHTTPServer
+import build_platform
+
+from lib import http_client
+from lib.jobs import JobQueue
+from lib.jobs import outside_jobs
+from lib.logger import LOGGER
+
+DEFAULT_PORT = 8765
+# How long responses like ATK versions catalog are served from memory before they are revalidated
+DEFAULT_CATALOG_TTL = 300
+LOG_POLL_TIMEOUT = 1.0
+
+# Fields of job request mapped to build_platform.py options
+VALUE_OPTIONS = (('release_tag', '-t'), ('atk_version', '-a'), ('destination', '-d'), ('workspace', '--workspace'),
+                 ('refs_txt', '-r'), ('changed_since', '--changed-since'), ('carry_over_from', '--carry-over-from'))
+LIST_OPTIONS = (('only', '--only'), ('builder', '--builder'))
+FLAG_OPTIONS = (('no_cache', '--no-cache'), ('fail_fast', '--fail-fast'), ('skip_expand', '--skip-expand'),
+                ('dry_run', '--dry-run'), ('offline_dependencies', '--offline-dependencies'))
+
+
+class RequestError(Exception):
+    pass
+
+
+def _is_string(value):
+    return isinstance(value, basestring)
+
+
+def _check_request(request):
+    refs = request.get('refs')
+    if refs is not None and not (isinstance(refs, dict) and all(_is_string(name) and _is_string(ref)
+                                                                for name, ref in refs.iteritems())):
+        raise RequestError('Field refs has to map project names to refs')
+    for field, option in LIST_OPTIONS:
+        value = request.get(field)
+        if value is not None and not (isinstance(value, list) and all(_is_string(item) for item in value)):
+            raise RequestError('Field {} has to be a list of strings'.format(field))
+    for field, option in VALUE_OPTIONS:
+        value = request.get(field)
+        if value is not None and not _is_string(value):
+            raise RequestError('Field {} has to be a string'.format(field))
+    for field, option in FLAG_OPTIONS:
+        value = request.get(field)
+        if value is not None and not isinstance(value, bool):
+            raise RequestError('Field {} has to be true or false'.format(field))
+
+
+def job_argv(request):
+    known = set(['refs'] + [field for field, option in VALUE_OPTIONS + LIST_OPTIONS + FLAG_OPTIONS])
+    unknown = [field for field in request if field not in known]
+    if unknown:
+        raise RequestError('Unknown fields: {}'.format(', '.join(sorted(unknown))))
+    _check_request(request)
+    argv = []
+    # Options are always in the same order, so equal requests give equal arguments
+    if request.get('refs'):
+        argv += ['-s'] + ['{}:{}'.format(name, ref) for name, ref in sorted(request['refs'].iteritems())]
+    for field, option in VALUE_OPTIONS:
+        if request.get(field):
+            argv += [option, request[field]]
+    for field, option in LIST_OPTIONS:
+        if request.get(field):
+            argv += [option] + sorted(request[field])
+    for field, option in FLAG_OPTIONS:
+        if request.get(field):
+            argv.append(option)
+    try:
+        build_platform.parse_args(argv)
+    except SystemExit:
+        raise RequestError('Invalid build options: {}'.format(' '.join(argv)))
+    return argv
+
+
+def run_job(job):
+    http_client.expire_cached_responses(catalog_ttl)
+    try:
+        build_platform.main(job.argv)
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    return 0
+
+
+class BuildRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def handle(self):
+        with outside_jobs():
+            BaseHTTPServer.BaseHTTPRequestHandler.handle(self)
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        if parts == ['jobs']:
+            self._send_json(200, [job.to_dict() for job in JOBS.jobs()])
+            return
+        job = JOBS.get(parts[1]) if len(parts) in (2, 3) and parts[0] == 'jobs' else None
+        if not job:
+            self._send_json(404, {'error': 'Unknown job'})
+        elif len(parts) == 2:
+            self._send_json(200, job.to_dict())
+        elif parts[2] == 'log':
+            query = urlparse.parse_qs(url.query)
+            try:
+                offset = int(query.get('offset', ['0'])[0])
+            except ValueError:
+                self._send_json(400, {'error': 'Offset has to be a number of lines'})
+                return
+            self._stream_log(job, max(0, offset), query.get('follow', ['1'])[0] != '0')
+        else:
+            self._send_json(404, {'error': 'Unknown resource'})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            self._send_json(404, {'error': 'Unknown resource'})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or '{}')
+            if not isinstance(request, dict):
+                raise RequestError('Job request has to be a JSON object')
+            argv = job_argv(request)
+        except (ValueError, RequestError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        job, created = JOBS.submit(json.dumps(argv), argv)
+        if created:
+            LOGGER.info('Queued build job %s: %s', job.id, ' '.join(argv))
+        else:
+            LOGGER.info('Request joined build job %s: %s', job.id, ' '.join(argv))
+        response = job.to_dict()
+        response['deduplicated'] = not created
+        self._send_json(202 if created else 200, response)
+
+    def _stream_log(self, job, offset, follow):
+        # Connection is closed after the last line, so clients read log until end of stream
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.end_headers()
+        while True:
+            finished = job.done()
+            lines = job.wait_for_lines(offset, LOG_POLL_TIMEOUT)
+            for line in lines:
+                self.wfile.write(line + '\n')
+            self.wfile.flush()
+            offset += len(lines)
+            if (finished and not lines) or not follow:
+                break
+        if follow:
+            self.wfile.write('Job {} {} with code {}\n'.format(job.id, job.status, job.return_code))
+
+    def _send_json(self, status, body):
+        content = json.dumps(body, indent=2, sort_keys=True)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def address_string(self):
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix-socket'
+
+    def log_message(self, format, *args):
+        LOGGER.debug('%s - %s', self.address_string(), format % args)
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ThreadingUnixHTTPServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Runs builds of TAP projects requested over local HTTP API, one at a time, '
+                                                 'in one long-running process.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on.')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on.')
+    parser.add_argument('--socket', required=False, help='Path to Unix socket to listen on instead of TCP port.')
+    parser.add_argument('--catalog-ttl', type=int, default=DEFAULT_CATALOG_TTL,
+                        help='Seconds after which cached responses like ATK versions catalog are revalidated.')
+    return parser.parse_args()
+
+
+JOBS = JobQueue(run_job)
+catalog_ttl = DEFAULT_CATALOG_TTL
+
+
+def main():
+    global catalog_ttl
+    args = parse_args()
+    catalog_ttl = args.catalog_ttl
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = ThreadingUnixHTTPServer(args.socket, BuildRequestHandler)
+        LOGGER.info('Build daemon listening on %s', args.socket)
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), BuildRequestHandler)
+        LOGGER.info('Build daemon listening on http://%s:%s', args.host, server.server_address[1])
+    JOBS.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == '__main__':
+    main()
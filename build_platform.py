@@ -15,83 +15,358 @@
 #
 
 import os
+import re
 import sys
+import copy
 import glob
-import shutil
 import threading
 import argparse
 import yaml
+import shlex
 import subprocess
 import builders.constants as constants
+from multiprocessing.pool import ThreadPool
 
-from Queue import Queue
 from builders.builder import Builder
 from builders.go_builder import GoBuilder
 from builders.tool_builder import ToolBuilder
 from builders.universal_builder import UniversalBuilder
+from builders.universal_builder import DEPENDENCY_CACHE
 from builders.atk_builder import AtkBuilder
 from builders.release_downloader import ReleaseDownloader
+from lib import processes
+from lib.admission import ADMISSION
+from lib.build_cache import BuildCache
+from lib.history import BUILT
+from lib.history import CACHED
+from lib.history import PROGRESS_LOG_INTERVAL
+from lib.history import BuildHistory
+from lib.history import format_duration
+from lib.history import job_priorities
+from lib.history import predict_makespan
 from lib.logger import LOGGER
+from lib.manifest import file_sha256
+from lib.manifest import ArtifactManifest
+from lib.plan import log_plan
+from lib.plan import make_plan
+from lib.plan import read_refs
+from lib.publish import publish_file
+from lib.retry import NETWORK_RETRY
+from lib.scheduler import Stage
+from lib.scheduler import Scheduler
+from lib.selection import carry_over
+from lib.selection import select_apps
+from lib.selection import select_changed_apps
+from lib.sharding import parse_shard
+from lib.sharding import select_shard
+from lib.sharding import assign_shards
+from lib.sharding import shard_result_path
+from lib.sharding import read_shard_result
+from lib.sharding import write_shard_result
+from lib.tox_env import prepare_tox_env
+from lib.tracing import TRACER
 
-threads = []
-threads_lock = threading.Lock()
-
-fails = []
-fails_lock = threading.Lock()
-
-
-def build_sources():
-    builders = {
-        'source_downloader': Builder,
-        'go': GoBuilder,
-        'tool': ToolBuilder,
-        'universal': UniversalBuilder,
-        'atk': AtkBuilder,
-        'release_downloader': ReleaseDownloader
-    }
-    while apps_queue.empty() is not True:
-        app = apps_queue.get()
-        builder = builders[app['builder']](app)
-        try:
-            if app['builder'] == 'release_downloader':
-                builder.download_release_zip(apps_output_path)
-            elif app['builder'] != 'atk':
-                builder.download_project_sources(snapshot=release_tag, url=os.path.join(constants.TAP_REPOS_URL, app['name']))
-                builder.build()
-                destination_zip_path = tools_output_path if app['builder'] == 'tool' else apps_output_path
-                if app['builder'] == 'universal':
-                    zip_path = glob.glob('{0}/{0}*.zip'.format(app['name']))[0]
-                    shutil.copy(zip_path, destination_zip_path)
-                else:
-                    builder.create_zip_package(destination_zip_path)
-                threads_lock.acquire()
-                refs_summary[builder.name] = builder.ref
-                threads_lock.release()
+BUILDERS = {
+    'source_downloader': Builder,
+    'go': GoBuilder,
+    'tool': ToolBuilder,
+    'universal': UniversalBuilder,
+    'atk': AtkBuilder,
+    'release_downloader': ReleaseDownloader
+}
+
+APPLOYER_PROJECT = 'apployer'
+
+refs_lock = threading.Lock()
+build_plan = {}
+prepare_apployer = False
+expand_sources = False
+apployer_env_path = None
+workspace_path = constants.PLATFORM_PARENT_PATH
+_app_yaml_cache = {}
+
+
+class AppBuild(object):
+
+    def __init__(self, app):
+        self.app = app
+        self.builder = None
+        self.cache_key = None
+        self.restored_from_cache = False
+        self.zip_path = None
+        self.sources_fetched = False
+
+    def stages(self):
+        if self.app['builder'] == 'release_downloader':
+            return [Stage('fetch', 'network', self.fetch_release, retry=NETWORK_RETRY)]
+        if self.app['builder'] == 'atk':
+            return [Stage('fetch', 'network', self.fetch_atk, retry=NETWORK_RETRY),
+                    Stage('build', 'cpu', self.build, wait_for_dependencies=True),
+                    Stage('package', 'cpu', self.package_atk)]
+        stages = [Stage('fetch', 'network', self.fetch, retry=NETWORK_RETRY),
+                  Stage('build', 'cpu', self.build, wait_for_dependencies=True),
+                  Stage('package', 'cpu', self.package),
+                  Stage('publish', 'io', self.publish)]
+        if self.app['builder'] == 'universal':
+            # Dependencies are downloaded by network workers, before the project waits for a processor to build it
+            stages.insert(1, Stage('prefetch', 'network', self.prefetch))
+        if self.app['name'] == APPLOYER_PROJECT and prepare_apployer:
+            # Environment for apployer expand is installed while other projects are still building
+            stages.append(Stage('prepare-env', 'network', self.prepare_apployer_env))
+        return stages
+
+    def destination_zip_path(self):
+        return tools_output_path if self.app['builder'] == 'tool' else apps_output_path
+
+    def fetch_release(self):
+        self.builder = BUILDERS[self.app['builder']](self.app)
+        self.builder.download_release_zip(apps_output_path)
+        artifacts.record(self.builder.package_path, self.builder.package_sha256, self.app['name'])
+
+    def fetch_atk(self):
+        self.builder = BUILDERS[self.app['builder']](self.app)
+        self.builder.download_project_sources(snapshot=atk_version, url=constants.ATK_REPOS_URL)
+
+    def package_atk(self):
+        self.builder.create_deployable_zip(apps_output_path, extra_files_paths=[os.path.join(constants.PLATFORM_PARENT_PATH, 'utils', self.app['name'], 'manifest.yml')])
+        artifacts.record(self.builder.package_path, self.builder.package_sha256, self.app['name'])
+
+    def fetch(self):
+        self.builder = BUILDERS[self.app['builder']](self.app)
+        planned_ref = build_plan.get(self.app['name'])
+        if build_cache and planned_ref and build_cache.lookup(build_cache.key(self.app, planned_ref)):
+            # Ref is known from build plan, so sources are not needed for cached package
+            self.builder.ref = planned_ref
+            self.cache_key = build_cache.key(self.app, planned_ref)
+            self.restored_from_cache = True
+            if expand_sources:
+                # Apployer expand still reads them from workspace, they are checked out from the mirror without building
+                self.builder.checkout_project_sources(planned_ref, url=os.path.join(constants.TAP_REPOS_URL, self.app['name']))
+                self.sources_fetched = True
+            return
+        self.fetch_sources()
+        self.cache_key = build_cache.key(self.app, self.builder.ref) if build_cache else None
+        if self.cache_key and build_cache.lookup(self.cache_key):
+            self.restored_from_cache = True
+
+    def fetch_sources(self):
+        self.builder.download_project_sources(snapshot=release_tag, url=os.path.join(constants.TAP_REPOS_URL, self.app['name']))
+        self.sources_fetched = True
+
+    def prefetch(self):
+        if not self.restored_from_cache:
+            self.builder.prefetch_dependencies()
+
+    def build(self):
+        if not self.restored_from_cache:
+            self.builder.build()
+
+    def package(self):
+        if self.restored_from_cache:
+            return
+        if self.app['builder'] == 'universal':
+            self.zip_path = glob.glob(os.path.join(self.builder.sources_path, '{}*.zip'.format(self.app['name'])))[0]
+        else:
+            self.builder.create_zip_package(self.destination_zip_path())
+            self.zip_path = os.path.join(self.destination_zip_path(), self.builder.zip_name)
+
+    def publish(self):
+        restored_path = build_cache.restore(self.cache_key, self.destination_zip_path()) if self.restored_from_cache else None
+        if restored_path:
+            LOGGER.info('Package for %s project restored from build cache (ref %s)', self.app['name'], self.builder.ref)
+            artifacts.record(restored_path, build_cache.digest(self.cache_key), self.app['name'])
+        else:
+            if self.restored_from_cache:
+                # Cache entry disappeared after lookup, so build the project after all
+                self.restored_from_cache = False
+                if not self.sources_fetched:
+                    self.fetch_sources()
+                self.build()
+                self.package()
+            if self.app['builder'] == 'universal':
+                with TRACER.span('publish', app=self.app['name']) as span:
+                    package_path = publish_file(self.zip_path, self.destination_zip_path())
+                    span.add_bytes(os.path.getsize(self.zip_path))
+                # Packages created by pack.sh are the only ones which are not hashed while being written
+                package_sha256 = file_sha256(package_path)
             else:
-                builder.download_project_sources(snapshot=atk_version, url=constants.ATK_REPOS_URL)
-                builder.build()
-                builder.create_deployable_zip(apps_output_path, extra_files_paths=[os.path.join(constants.PLATFORM_PARENT_PATH, 'utils', app['name'], 'manifest.yml')])
-        except Exception as e:
-            LOGGER.error('Cannot build %s due to %s', app['name'], e)
-            fails_lock.acquire()
-            fails.append(app['name'])
-            fails_lock.release()
+                package_path, package_sha256 = self.builder.package_path, self.builder.package_sha256
+            artifacts.record(package_path, package_sha256, self.app['name'])
+            if self.cache_key:
+                build_cache.store(self.cache_key, self.zip_path, self.builder.ref, package_sha256)
+        with refs_lock:
+            refs_summary[self.builder.name] = self.builder.ref
+
+
+    def prepare_apployer_env(self):
+        global apployer_env_path
+        if not self.sources_fetched:
+            self.fetch_sources()
+        with TRACER.span('apployer-tox', app=APPLOYER_PROJECT), \
+                open(self.builder.build_log_path, 'a') as build_log, open(self.builder.err_log_path, 'a') as err_log:
+            apployer_env_path = prepare_tox_env(self.builder.sources_path, self.builder.ref, constants.TOX_ENVS_PATH,
+                                                stdout=build_log, stderr=err_log)
+
+
+def planned_mode(app):
+    planned_ref = build_plan.get(app['name'])
+    return CACHED if build_cache and planned_ref and build_cache.lookup(build_cache.key(app, planned_ref)) else BUILT
+
+
+def estimate_jobs(jobs, history, modes):
+    # Jobs are (name, stages, after, running_for) tuples, estimates come from previous runs of the same projects
+    durations = dict((name, [history.estimate(name, stage.name, modes[name]) for stage in stages])
+                     for name, stages, after, running_for in jobs)
+    priorities = job_priorities(dict((name, sum(stage_durations)) for name, stage_durations in durations.iteritems()),
+                                dict((name, after) for name, stages, after, running_for in jobs))
+    return dict((name, {'stages': [(stage.pool, duration, stage.wait_for_dependencies)
+                                   for stage, duration in zip(stages, durations[name])],
+                        'after': after, 'priority': priorities[name], 'running_for': running_for})
+                for name, stages, after, running_for in jobs)
+
+
+def log_progress(scheduler, history, modes, pool_sizes, finished):
+    while not finished.wait(PROGRESS_LOG_INTERVAL):
+        remaining = scheduler.remaining()
+        estimates = estimate_jobs([(job.name, stages, job.after, running_for) for job, stages, running_for in remaining],
+                                  history, modes)
+        LOGGER.info('Progress: %s of %s projects finished, ETA %s', len(modes) - len(remaining), len(modes),
+                    format_duration(predict_makespan(estimates, pool_sizes)))
+
+
+def build_sources(apps, fail_fast=False):
+    pool_sizes = {'network': constants.NETWORK_WORKERS_COUNT, 'cpu': constants.CPU_CORES_COUNT, 'io': constants.IO_WORKERS_COUNT}
+    scheduler = Scheduler(pool_sizes, fail_fast=fail_fast)
+    history = BuildHistory(constants.BUILD_HISTORY_PATH)
+    modes = dict((app['name'], planned_mode(app)) for app in apps)
+    builds = [AppBuild(app) for app in apps]
+    jobs = [(build.app['name'], build.stages(), build.app.get('after'), None) for build in builds]
+    estimates = estimate_jobs(jobs, history, modes)
+    # Projects which take longest, together with projects waiting for them, are started first
+    for build, (name, stages, after, running_for) in zip(builds, jobs):
+        scheduler.add_job(name, stages, after=after, required=build.app.get('required', True), priority=estimates[name]['priority'])
+    LOGGER.info('Predicted build time with %s network, %s cpu and %s io workers: %s', pool_sizes['network'], pool_sizes['cpu'],
+                pool_sizes['io'], format_duration(predict_makespan(estimates, pool_sizes)))
+
+    finished = threading.Event()
+    progress = threading.Thread(target=log_progress, args=(scheduler, history, modes, pool_sizes, finished), name='progress')
+    progress.daemon = True
+    progress.start()
+    try:
+        fails = scheduler.run()
+    finally:
+        finished.set()
+
+    apps_summary = TRACER.summary()['apps']
+    history.record([(build.app['name'], CACHED if build.restored_from_cache else BUILT, apps_summary[build.app['name']]['stages'])
+                    for build in builds if build.app['name'] in apps_summary and build.app['name'] not in fails])
+    return fails
+
+
+def is_selective(args):
+    return bool(args.only or args.builder or args.changed_since)
+
+
+def checkout_carried_over_sources(apps, carried_refs):
+    # Apployer expand reads sources of all projects, so also the carried over ones are checked out at their previous refs
+    git_apps = [app for app in apps if app['builder'] not in ('atk', 'release_downloader')]
+    missing = [app['name'] for app in git_apps if app['name'] not in carried_refs]
+
+    def checkout(app):
+        try:
+            Builder(app).checkout_project_sources(carried_refs[app['name']], url=os.path.join(constants.TAP_REPOS_URL, app['name']))
+            return None
+        except Exception:
+            return app['name']
+
+    pool = ThreadPool(max(1, min(constants.NETWORK_WORKERS_COUNT, len(git_apps))))
+    try:
+        failed = pool.map(checkout, [app for app in git_apps if app['name'] in carried_refs])
+    finally:
+        pool.close()
+    return missing + [name for name in failed if name]
+
+
+def shard_worker_command(args, index, count, trace_dir, apps):
+    command = shlex.split(args.worker_command.format(shard=index)) if args.worker_command else []
+    command += [sys.executable, os.path.abspath(__file__), '--shard', '{}/{}'.format(index, count),
+                '-d', destination_path, '--trace-dir', os.path.join(trace_dir, 'shard-{}'.format(index))]
+    for option, value in (('-r', args.refs_txt), ('-t', args.release_tag), ('-a', args.atk_version), ('--workspace', args.workspace),
+                          ('--cache-dir', args.cache_dir), ('--git-cache-dir', args.git_cache_dir),
+                          ('--build-memory', args.build_memory)):
+        if value:
+            command += [option, str(value)]
+    if args.spec_version:
+        command += ['-s'] + args.spec_version
+    if args.no_cache:
+        command.append('--no-cache')
+    if args.fail_fast:
+        command.append('--fail-fast')
+    if args.offline_dependencies:
+        command.append('--offline-dependencies')
+    if args.skip_expand:
+        command.append('--skip-expand')
+    if is_selective(args):
+        # Selection is resolved by coordinator, so workers split exactly the same projects into shards
+        command += ['--only'] + [app['name'] for app in apps]
+    return command
+
+
+def build_shards(args, apps, trace_dir):
+    shards = assign_shards(apps, args.shards)
+    logs_path = os.path.join(workspace_path, 'logs')
+    if not os.path.exists(logs_path):
+        os.makedirs(logs_path)
+    workers = []
+    for index, shard in enumerate(shards):
+        if not shard:
+            continue
+        if os.path.exists(shard_result_path(files_output_path, index)):
+            os.remove(shard_result_path(files_output_path, index))
+        log_path = os.path.join(logs_path, 'shard-{}.log'.format(index))
+        LOGGER.info('Starting shard %s/%s with %s projects, log in %s', index, args.shards, len(shard), log_path)
+        with open(log_path, 'w') as shard_log:
+            worker = subprocess.Popen(shard_worker_command(args, index, args.shards, trace_dir, apps),
+                                      stdout=shard_log, stderr=subprocess.STDOUT)
+        workers.append((index, shard, worker))
+
+    fails = []
+    for index, shard, worker in workers:
+        with TRACER.span('shard-{}'.format(index)):
+            return_code = worker.wait()
+        result = read_shard_result(files_output_path, index)
+        if result is None:
+            LOGGER.error('Shard %s/%s exited with %s without result', index, args.shards, return_code)
+            fails.extend(shard)
+            continue
+        refs_summary.update(result['refs'])
+        artifacts.update(result['artifacts'])
+        fails.extend(result['failed'])
+    return fails
 
 
 def load_app_yaml(path):
-    with open(path, 'r') as stream:
-        return yaml.load(stream)
+    # Parsed file is kept until it changes, so builds started from build daemon do not parse it again
+    mtime = os.path.getmtime(path)
+    if _app_yaml_cache.get(path, (None, None))[0] != mtime:
+        with open(path, 'r') as stream:
+            _app_yaml_cache[path] = (mtime, yaml.load(stream))
+    # Applications are modified by every build, so each build gets its own copy
+    return copy.deepcopy(_app_yaml_cache[path][1])
 
 def run_apployer_expand():
-    apployer_repo_path = os.path.join(constants.PLATFORM_PARENT_PATH, 'apployer')
-    subprocess.check_call(['tox', '-r', '--notest'], cwd=apployer_repo_path)
-    subprocess.check_call([os.path.join('.tox', 'py27', 'bin', 'apployer'),
-                           'expand', constants.PLATFORM_PARENT_PATH], cwd=apployer_repo_path)
+    apployer_repo_path = os.path.join(workspace_path, APPLOYER_PROJECT)
+    env_path = apployer_env_path
+    if not env_path:
+        with TRACER.span('apployer-tox', app=APPLOYER_PROJECT):
+            env_path = prepare_tox_env(apployer_repo_path, refs_summary.get(APPLOYER_PROJECT), constants.TOX_ENVS_PATH)
+    with TRACER.span('apployer-expand', app=APPLOYER_PROJECT):
+        subprocess.check_call([os.path.join(env_path, 'py27', 'bin', 'apployer'),
+                               'expand', workspace_path], cwd=apployer_repo_path)
     subprocess.check_call(['mv', os.path.join(apployer_repo_path, 'expanded_appstack.yml'), files_output_path], cwd=constants.PLATFORM_PARENT_PATH)
+    artifacts.record(os.path.join(files_output_path, 'expanded_appstack.yml'), app=APPLOYER_PROJECT)
 
-apps_queue = Queue()
-
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Downloads and builds TAP projects in specified version.")
 
     parser.add_argument('-r', '--refs-txt', required=False, help='Path to refs.txt file')
@@ -100,14 +375,54 @@ def parse_args():
     parser.add_argument('-d', '--destination', required=False, help='Destination path for zip packages.')
     parser.add_argument('-t', '--release-tag', required=False, help='Specifies a release tag for TAP repositories.')
     parser.add_argument('-a', '--atk-version', required=False, help='Specifies a ATK components version.')
+    parser.add_argument('--workspace', required=False,
+                        help='Name of workspace with projects sources, logs and packages, so builds of different versions '
+                             'can run at the same time (release tag by default when it is given).')
+    parser.add_argument('--no-cache', action='store_true', help='Rebuild all projects without using packages from build cache.')
+    parser.add_argument('--cache-dir', required=False, help='Path to build cache directory.')
+    parser.add_argument('--git-cache-dir', required=False, help='Path to directory with mirrors of projects repositories.')
+    parser.add_argument('--trace-dir', required=False, help='Path to directory for build trace and its summary.')
+    parser.add_argument('--build-memory', type=int, required=False,
+                        help='Memory in MB which can be used by concurrent builds (physical memory by default).')
+    parser.add_argument('--shards', type=int, required=False,
+                        help='Splits projects into given number of shards built by separate worker processes.')
+    parser.add_argument('--shard', required=False, help='Builds only given shard (<index>/<count>) of projects.')
+    parser.add_argument('--worker-command', required=False,
+                        help='Command prefix for starting shard workers, e.g. "ssh build-{shard}".')
+    parser.add_argument('--fail-fast', action='store_true',
+                        help='Cancels remaining builds and stops running commands when a required project fails.')
+    parser.add_argument('--offline-dependencies', action='store_true',
+                        help='Builds universal projects using only Maven and npm dependencies in dependency cache.')
+    parser.add_argument('--only', nargs='+', required=False,
+                        help='Builds only projects with given names or matching given globs, and projects they are built after.')
+    parser.add_argument('--builder', nargs='+', required=False, choices=sorted(BUILDERS),
+                        help='Builds only projects using given builders, and projects they are built after.')
+    parser.add_argument('--changed-since', required=False,
+                        help='Builds only projects whose refs differ from given refs.txt file, and projects related to them.')
+    parser.add_argument('--carry-over-from', required=False,
+                        help='Destination path of previous build, which provides packages and refs of projects which '
+                             'are not selected (destination path by default).')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Resolves refs of all projects, logs build plan and exits without building.')
+    parser.add_argument('--skip-expand', action='store_true', help='Do not run apployer expand after building packages.')
+
+    return parser.parse_args(argv)
 
-    return parser.parse_args()
+def workspace_name(args):
+    name = args.workspace if args.workspace else args.release_tag
+    return re.sub(r'[^\w.-]', '_', name) if name else None
 
-def main():
-    global tools_output_path, apps_output_path, files_output_path, release_tag, atk_version, destination_path, refs_summary
+def main(argv=None):
+    global tools_output_path, apps_output_path, files_output_path, release_tag, atk_version, destination_path, refs_summary, build_cache, prepare_apployer, expand_sources, artifacts, workspace_path, build_plan, apployer_env_path
+    # Build daemon runs many builds in one process, so nothing is carried over from the previous one
     refs_summary = dict()
+    build_plan = dict()
+    apployer_env_path = None
+    workspace_path = constants.PLATFORM_PARENT_PATH
+    TRACER.reset()
+    processes.reset()
 
-    args = parse_args()
+    args = parse_args(argv)
 
     input_refs_file = dict()
     if args.refs_txt:
@@ -126,19 +441,45 @@ def main():
             item = ver.split(':')
             input_refs_file[item[0]] = item[1]
 
+    workspace = workspace_name(args)
+    if workspace:
+        # Sources of every workspace are checked out next to each other and share objects of git mirrors
+        workspace_path = os.path.join(constants.WORKSPACES_PATH, workspace)
+        LOGGER.info('Using workspace %s in %s', workspace, workspace_path)
+
     projects_names = load_app_yaml(constants.APPS_YAML_FILE_PATH)
-    for app in projects_names['applications']:
+    apps = projects_names['applications']
+    for app in apps:
+        if workspace:
+            app['workspace_path'] = workspace_path
         if 'snapshot' not in app:
             app['snapshot'] = input_refs_file[app['name']] if app['name'] in input_refs_file else None
-        apps_queue.put(app)
+        if args.git_cache_dir:
+            app['git_mirrors_path'] = args.git_cache_dir
+
+    all_apps = apps
+    if args.only or args.builder:
+        apps = select_apps(apps, args.only, args.builder)
+    if args.shard:
+        shard_index, shard_count = parse_shard(args.shard)
+        apps = select_shard(apps, shard_index, shard_count)
 
     destination_path = args.destination if args.destination else constants.DEFAULT_DESTINATION_PATH
+    if workspace and not args.destination:
+        destination_path = os.path.join(destination_path, workspace)
     tools_output_path = os.path.join(destination_path, 'tools')
     apps_output_path = os.path.join(destination_path, 'apps')
     files_output_path = os.path.join(destination_path, 'files')
 
+    artifacts = ArtifactManifest(destination_path)
+    prepare_apployer = not (args.skip_expand or args.shard or args.dry_run)
+    # Shard workers check out sources for apployer expand run by the coordinator
+    expand_sources = not (args.skip_expand or args.dry_run)
     release_tag = args.release_tag if args.release_tag else None
     atk_version = args.atk_version if args.atk_version else constants.DEFAULT_ATK_VERSION
+    DEPENDENCY_CACHE.offline = args.offline_dependencies
+    ADMISSION.memory_mb = args.build_memory if args.build_memory else ADMISSION.total_memory_mb
+    build_cache = None if args.no_cache else BuildCache(args.cache_dir if args.cache_dir else constants.BUILD_CACHE_PATH)
 
     if not os.path.exists(tools_output_path):
         os.makedirs(tools_output_path)
@@ -147,24 +488,58 @@ def main():
     if not os.path.exists(files_output_path):
         os.makedirs(files_output_path)
 
-    for i in range(constants.CPU_CORES_COUNT):
-        threads.append(threading.Thread(target=build_sources))
-        threads[i].start()
+    trace_dir = args.trace_dir if args.trace_dir else os.path.join(workspace_path, 'logs')
+    try:
+        with TRACER.span('plan'):
+            plan = make_plan(apps, constants.TAP_REPOS_URL, release_tag,
+                             read_refs(os.path.join(files_output_path, 'refs.txt')), constants.NETWORK_WORKERS_COUNT)
+        apps_by_name = dict((app['name'], app) for app in apps)
+        for planned in plan:
+            if planned.ref:
+                build_plan[planned.name] = planned.ref
+                planned.cached = bool(build_cache and build_cache.lookup(build_cache.key(apps_by_name[planned.name], planned.ref)))
+        log_plan(plan)
+        if args.changed_since:
+            apps = select_changed_apps(apps, plan, read_refs(args.changed_since))
+        if is_selective(args):
+            LOGGER.info('Selected %s of %s projects: %s', len(apps), len(all_apps), ', '.join(app['name'] for app in apps))
+        if args.dry_run:
+            return
+
+        missing_sources = []
+        if is_selective(args) and not args.shard:
+            selected_names = set(app['name'] for app in apps)
+            carried_refs = carry_over(args.carry_over_from if args.carry_over_from else destination_path, destination_path,
+                                      set(app['name'] for app in all_apps) - selected_names, artifacts)
+            refs_summary.update(carried_refs)
+            if expand_sources:
+                missing_sources = checkout_carried_over_sources([app for app in all_apps if app['name'] not in selected_names],
+                                                                carried_refs)
+
+        fails = build_shards(args, apps, trace_dir) if args.shards else build_sources(apps, args.fail_fast)
 
-    for i in range(constants.CPU_CORES_COUNT):
-        threads[i].join()
+        if args.shard:
+            write_shard_result(files_output_path, shard_index, refs_summary, fails, artifacts.artifacts())
+            sys.exit(1 if fails else 0)
 
-    with open(os.path.join(files_output_path, 'refs.txt'), 'w') as ref_file:
-        for key, value in refs_summary.iteritems():
-            ref_file.write('{} {}\n'.format(key, value))
+        with open(os.path.join(files_output_path, 'refs.txt'), 'w') as ref_file:
+            for key, value in refs_summary.iteritems():
+                ref_file.write('{} {}\n'.format(key, value))
+        artifacts.record(os.path.join(files_output_path, 'refs.txt'))
+        artifacts.save()
 
-    if fails:
-        LOGGER.error('Cannot build platform packages!')
-        for app_name in fails:
-            LOGGER.error('%s project failed.', app_name)
-        sys.exit(1)
-    else:
-        run_apployer_expand()
+        if fails:
+            LOGGER.error('Cannot build platform packages!')
+            for app_name in fails:
+                LOGGER.error('%s project failed.', app_name)
+            sys.exit(1)
+        elif missing_sources:
+            LOGGER.warning('Skipping apployer expand, sources of carried over projects are missing: %s', ', '.join(missing_sources))
+        elif not args.skip_expand:
+            run_apployer_expand()
+            artifacts.save()
+    finally:
+        TRACER.export(trace_dir)
 
 
 if __name__ == '__main__':
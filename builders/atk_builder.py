@@ -20,14 +20,22 @@ import json
 import ntpath
 import tarfile
 import shutil
-import zipfile
 import yaml
 
 from builders.builder import Builder
+from lib import http_client
 from lib.logger import LOGGER
+from lib.publish import staged_file
+from lib.tracing import TRACER
+from lib.download import ChecksumError
+from lib.download import download_file
+from lib.download import extract_tar_stream
+from lib.zip_writer import ZipWriter
+from lib.zip_writer import DEFAULT_COMPRESSION_LEVEL
 from builders.constants import ATK_REPOS_URL
 from builders.constants import PLATFORM_PARENT_PATH
 from builders.constants import LATEST_ATK_VERSION
+from builders.constants import HTTP_CACHE_PATH
 
 class AtkBuilder(Builder):
 
@@ -35,20 +43,27 @@ class AtkBuilder(Builder):
         self.name = app_info.get('name')
         self.tar_name = app_info.get('tar_name')
         self.zip_name = app_info.get('zip_name')
+        self.tar_sha256 = app_info.get('tar_sha256')
+        self.stream_extract = app_info.get('stream_extract', False)
+        self.transcode = app_info.get('transcode', True) and not self.stream_extract
+        self.compression_level = app_info.get('compression_level', DEFAULT_COMPRESSION_LEVEL)
+        self.workspace_path = app_info.get('workspace_path', PLATFORM_PARENT_PATH)
+        self._local_sources_path = None
+        self.package_path = None
+        self.package_sha256 = None
         self._save_versions_catalog()
 
     def _save_versions_catalog(self):
         versions_url = os.path.join(ATK_REPOS_URL, 'version.json')
         try:
-            response = requests.get(versions_url)
+            self._versions_catalog = json.loads(http_client.get_cached_text(versions_url, HTTP_CACHE_PATH))
         except requests.exceptions.RequestException as e:
             LOGGER.error('Cannot building {} project. Cannot get versions catalog.'.format(self.name))
             raise e
-        self._versions_catalog = json.loads(response.text)
 
     def download_project_sources(self, snapshot=None, url=None):
         self.url = url
-        self._download_tar_file(self.tar_name, snapshot, os.path.join(PLATFORM_PARENT_PATH, '{}.tar.gz'.format(self.name)))
+        self._download_tar_file(self.tar_name, snapshot, os.path.join(self.workspace_path, '{}.tar.gz'.format(self.name)))
 
     def _download_tar_file(self, tar_name, version, dest_tar_path):
         LOGGER.info('Downloading {} in version {} for {} project'.format(tar_name, version, self.name))
@@ -62,9 +77,16 @@ class AtkBuilder(Builder):
         download_url = os.path.join(self.url, catalog_name_in_path, 'binaries', tar_name)
 
         try:
-            response = requests.get(download_url)
-            with open(dest_tar_path, 'wb') as tar:
-                tar.write(response.content)
+            with TRACER.span('download', app=self.name) as span:
+                if self.stream_extract:
+                    self._local_sources_path = os.path.join(self.workspace_path, self.name)
+                    span.add_bytes(extract_tar_stream(download_url, self._local_sources_path, sha256=self.tar_sha256))
+                else:
+                    download_file(download_url, dest_tar_path, sha256=self.tar_sha256)
+                    span.add_bytes(os.path.getsize(dest_tar_path))
+        except ChecksumError as e:
+            LOGGER.error('Downloaded {} tar archive for {} project is corrupted.'.format(tar_name, self.name))
+            raise e
         except requests.exceptions.RequestException as e:
             LOGGER.error('Cannot download {} tar archive for {} project.'.format(tar_name, self.name))
             raise e
@@ -76,34 +98,78 @@ class AtkBuilder(Builder):
                     .format(self.name, download_url, version))
 
     def build(self):
-        self.extract_tar_file(os.path.join(PLATFORM_PARENT_PATH, self.name))
+        if self.stream_extract or self.transcode:
+            return
+        self.extract_tar_file(os.path.join(self.workspace_path, self.name))
 
     def extract_tar_file(self, dest_path, source_path=None):
         tar_path = source_path if source_path else self._local_tar_path
         self._local_sources_path = dest_path
         try:
-            tar = tarfile.open(tar_path)
-            tar.extractall(self._local_sources_path)
-            tar.close()
+            with TRACER.span('extract', app=self.name) as span:
+                tar = tarfile.open(tar_path)
+                tar.extractall(self._local_sources_path)
+                tar.close()
+                span.add_bytes(os.path.getsize(tar_path))
         except Exception as e:
             LOGGER.error('Cannot extract tar file for {} project'.format(self.name))
             raise e
 
+    def _manifest_with_version(self, manifest_path):
+        with open(manifest_path, 'r') as f_stream:
+            manifest_yml = yaml.load(f_stream)
+        manifest_yml['applications'][0]['env']['VERSION'] = self._version_in_manifest
+        return yaml.safe_dump(manifest_yml)
+
+    def transcode_tar_to_zip(self, path_for_zip, extra_files_paths=None):
+        # Tar members are read in archive order and written straight into the package, nothing is extracted
+        extra_files_paths = extra_files_paths if extra_files_paths else []
+        extra_names = set(ntpath.basename(extra_file_path) for extra_file_path in extra_files_paths)
+        try:
+            with TRACER.span('transcode', app=self.name) as span, staged_file(path_for_zip) as staged_zip_path:
+                with ZipWriter(staged_zip_path, compression_level=self.compression_level) as deployable_zip:
+                    tar = tarfile.open(self._local_tar_path)
+                    for member in tar:
+                        arcname = os.path.normpath(member.name)
+                        if not (member.isfile() or member.issym() or member.islnk()) or arcname in extra_names:
+                            continue
+                        member_file = tar.extractfile(member)
+                        # Links are stored as files they point to, same as zipping extracted tree
+                        if member_file is None:
+                            continue
+                        target = tar._find_link_target(member) if member.issym() or member.islnk() else member
+                        deployable_zip.add_stream(arcname, member_file, target.size, mode=target.mode, mtime=target.mtime)
+                    tar.close()
+                    for extra_file_path in extra_files_paths:
+                        if ntpath.basename(extra_file_path) == 'manifest.yml':
+                            deployable_zip.add_bytes('manifest.yml', self._manifest_with_version(extra_file_path))
+                        else:
+                            deployable_zip.add_file(extra_file_path, ntpath.basename(extra_file_path))
+                span.add_bytes(os.path.getsize(staged_zip_path))
+            self.package_path = path_for_zip
+            self.package_sha256 = deployable_zip.sha256
+        except Exception as e:
+            LOGGER.error('Cannot create zip package for {}'.format(self.name))
+            raise e
+
     def create_deployable_zip(self, path_for_zip, sources_path=None, extra_files_paths=None):
         LOGGER.info('Creating zip package for {} project'.format(self.name))
         if not os.path.exists(path_for_zip):
             os.makedirs(path_for_zip)
+        if self.transcode and not sources_path:
+            self.transcode_tar_to_zip(os.path.join(path_for_zip, (self.zip_name if self.zip_name else self.name) + '.zip'),
+                                      extra_files_paths)
+            LOGGER.info("Package for {} has been created".format(self.name))
+            return
         project_files_path = sources_path if sources_path else self._local_sources_path
         try:
             for extra_file_path in extra_files_paths:
                 shutil.copyfile(extra_file_path, os.path.join(project_files_path, ntpath.basename(extra_file_path)))
                 if ntpath.basename(extra_file_path) == 'manifest.yml':
                     app_manifest_path = os.path.join(project_files_path, ntpath.basename(extra_file_path))
-                    with open(app_manifest_path, 'r') as f_stream:
-                        manifest_yml = yaml.load(f_stream)
-                    manifest_yml['applications'][0]['env']['VERSION'] = self._version_in_manifest
+                    manifest = self._manifest_with_version(app_manifest_path)
                     with open(app_manifest_path, 'w') as f_stream:
-                        f_stream.write(yaml.safe_dump(manifest_yml))
+                        f_stream.write(manifest)
         except Exception as e:
             LOGGER.error('Cannot add extra files to {} project zip package'.format(self.name))
             raise e
@@ -111,12 +177,15 @@ class AtkBuilder(Builder):
         path_for_zip = os.path.join(path_for_zip, self.zip_name + '.zip') if self.zip_name else os.path.join(path_for_zip, self.name + '.zip')
 
         try:
-            deployable_zip = zipfile.ZipFile(path_for_zip, 'w')
-            for root, dirs, files in os.walk(project_files_path):
-                for file in files:
-                    deployable_zip.write(os.path.join(os.path.relpath(root, PLATFORM_PARENT_PATH), file),
-                                         os.path.join(os.path.relpath(root, os.path.join(PLATFORM_PARENT_PATH, self.name)), file))
-            deployable_zip.close()
+            with TRACER.span('zip', app=self.name) as span, staged_file(path_for_zip) as staged_zip_path:
+                with ZipWriter(staged_zip_path, compression_level=self.compression_level) as deployable_zip:
+                    for root, dirs, files in os.walk(project_files_path):
+                        for file in files:
+                            deployable_zip.add_file(os.path.join(root, file),
+                                                    os.path.join(os.path.relpath(root, os.path.join(self.workspace_path, self.name)), file))
+                span.add_bytes(os.path.getsize(staged_zip_path))
+            self.package_path = path_for_zip
+            self.package_sha256 = deployable_zip.sha256
         except Exception as e:
             LOGGER.error('Cannot create zip package for {}'.format(self.name))
             raise e
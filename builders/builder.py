@@ -15,11 +15,16 @@
 #
 
 import os
-import subprocess
-import zipfile
 
 from constants import PLATFORM_PARENT_PATH
+from constants import GIT_MIRRORS_PATH
+from lib.admission import ADMISSION
+from lib.git_mirror import GitMirrorCache
+from lib.zip_writer import ZipWriter
+from lib.zip_writer import DEFAULT_COMPRESSION_LEVEL
 from lib.logger import LOGGER
+from lib.publish import staged_file
+from lib.tracing import TRACER
 
 class Builder:
 
@@ -27,10 +32,16 @@ class Builder:
         self.name = app_info.get('name')
         self.snapshot = app_info.get('snapshot')
         self.url = app_info.get('url')
-        self.sources_path = os.path.join(PLATFORM_PARENT_PATH, self.name)
+        self.workspace_path = app_info.get('workspace_path', PLATFORM_PARENT_PATH)
+        self.sources_path = os.path.join(self.workspace_path, self.name)
         self.zip_name = '{}.zip'.format(app_info.get('zip_name', self.name))
         self.zip_items = app_info['items'] if 'items' in app_info else [self.sources_path]
-        self.logs_directory_path = os.path.join(PLATFORM_PARENT_PATH, 'logs')
+        self.compression_level = app_info.get('compression_level', DEFAULT_COMPRESSION_LEVEL)
+        self.resources = app_info.get('resources', {})
+        self.package_path = None
+        self.package_sha256 = None
+        self.git_mirrors = GitMirrorCache(app_info.get('git_mirrors_path', GIT_MIRRORS_PATH))
+        self.logs_directory_path = os.path.join(self.workspace_path, 'logs')
         if not os.path.exists(self.logs_directory_path):
             os.makedirs(self.logs_directory_path)
         self.build_log_path = os.path.join(self.logs_directory_path, self.name + '-build.log')
@@ -39,35 +50,52 @@ class Builder:
     def build(self):
         pass
 
+    def admitted(self):
+        return ADMISSION.admit(self.name, self.resources.get('cores'), self.resources.get('memory'))
+
     def download_project_sources(self, snapshot=None, url=None):
         self.snapshot = self.snapshot if self.snapshot else snapshot
         self.url = self.url if self.url else url
         with open(self.build_log_path, 'a') as build_log, \
                 open(self.err_log_path, 'a') as err_log:
-            if os.path.exists(self.sources_path):
-                LOGGER.info('Updating sources for {} project'.format(self.name))
-                try:
-                    subprocess.check_call(['git', 'checkout', 'master'], cwd=self.sources_path, stdout=build_log, stderr=err_log)
-                    subprocess.check_call(['git', 'pull'], cwd=self.sources_path, stdout=build_log, stderr=err_log)
-                except Exception as e:
-                    LOGGER.error('Cannot update sources for {} project'.format(self.name))
-                    raise e
-                LOGGER.info('Sources for {} project has been updated'.format(self.name))
-            else:
-                LOGGER.info('Downloading {} project sources'.format(self.name))
-                try:
-                    subprocess.check_call(['git', 'clone', self.url], cwd=PLATFORM_PARENT_PATH, stdout=build_log, stderr=err_log)
-                except Exception as e:
-                    LOGGER.error('Cannot download sources for {} project'.format(self.name))
-                    raise e
-                LOGGER.info('Sources for {} project has been downloaded'.format(self.name))
+            LOGGER.info('Updating {} project mirror'.format(self.name))
+            try:
+                with TRACER.span('git-fetch', app=self.name):
+                    self.git_mirrors.update(self.url, stdout=build_log, stderr=err_log)
+            except Exception as e:
+                LOGGER.error('Cannot download sources for {} project'.format(self.name))
+                raise e
+            revision = 'master'
             if self.snapshot:
                 LOGGER.info('Setting release tag {} for {} project sources'.format(self.snapshot, self.name))
-                try:
-                    subprocess.check_call(['git', 'checkout', self.snapshot], cwd=self.sources_path, stdout=build_log, stderr=err_log)
-                except Exception:
+                if self.git_mirrors.resolve(self.url, self.snapshot):
+                    revision = self.snapshot
+                else:
                     LOGGER.warning('Cannot set release tag {} for {} project sources. Using "master" branch.'.format(self.snapshot, self.name))
-            self.ref = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=self.sources_path).rstrip()
+            try:
+                with TRACER.span('git-checkout', app=self.name):
+                    self.ref = self.git_mirrors.checkout(self.url, revision, self.sources_path, stdout=build_log, stderr=err_log)
+            except Exception as e:
+                LOGGER.error('Cannot update sources for {} project'.format(self.name))
+                raise e
+            LOGGER.info('Sources for {} project has been updated'.format(self.name))
+
+    def checkout_project_sources(self, ref, url=None):
+        self.url = self.url if self.url else url
+        with open(self.build_log_path, 'a') as build_log, \
+                open(self.err_log_path, 'a') as err_log:
+            try:
+                # Mirror is fetched only when it does not know the commit yet
+                if not self.git_mirrors.resolve(self.url, ref):
+                    LOGGER.info('Updating {} project mirror'.format(self.name))
+                    with TRACER.span('git-fetch', app=self.name):
+                        self.git_mirrors.update(self.url, stdout=build_log, stderr=err_log)
+                with TRACER.span('git-checkout', app=self.name):
+                    self.ref = self.git_mirrors.checkout(self.url, ref, self.sources_path, stdout=build_log, stderr=err_log)
+            except Exception as e:
+                LOGGER.error('Cannot check out {} revision of {} project sources'.format(ref, self.name))
+                raise e
+            LOGGER.info('Sources for {} project has been checked out at {}'.format(self.name, ref))
 
     def create_zip_package(self, dest_path, zip_name=None, zip_items=None):
         zip_name = zip_name if zip_name else self.zip_name
@@ -75,32 +103,33 @@ class Builder:
         try:
             if not os.path.exists(dest_path):
                 os.makedirs(dest_path)
-            if os.path.exists(os.path.join(dest_path, zip_name)):
-                os.remove(os.path.join(dest_path, zip_name))
-            zip_package = zipfile.ZipFile(os.path.join(dest_path, zip_name), 'w')
+            zip_path = os.path.join(dest_path, zip_name)
+            with TRACER.span('zip', app=self.name) as span, staged_file(zip_path) as staged_zip_path:
+                # Unchanged files are copied from previous package without compressing them again
+                with ZipWriter(staged_zip_path, compression_level=self.compression_level, previous_path=zip_path) as zip_package:
+                    zip_items = zip_items if zip_items else self.zip_items
+                    if zip_items:
+                        zip_items_abs_paths = []
+                        for item in zip_items:
+                            zip_items_abs_paths.append(os.path.join(self.sources_path, item))
 
-            zip_items = zip_items if zip_items else self.zip_items
-            if zip_items:
-                zip_items_abs_paths = []
-                for item in zip_items:
-                    zip_items_abs_paths.append(os.path.join(self.sources_path, item))
-
-            for item in zip_items_abs_paths:
-                if os.path.isdir(item):
-                    for root, dirs, files in os.walk(item):
-                        for file in files:
-                            if os.path.islink(os.path.join(root, file)):
-                                link_dest = os.readlink(os.path.join(root, file))
-                                attr = zipfile.ZipInfo()
-                                attr.filename = os.path.relpath(os.path.join(root, file), self.sources_path)
-                                attr.create_system = 3 # local system code
-                                attr.external_attr = 2716663808L # symlink magic number
-                                zip_package.writestr(attr, link_dest)
-                            else:
-                                zip_package.write(os.path.join(root, file), os.path.relpath(os.path.join(root, file), self.sources_path))
-                else:
-                    zip_package.write(item, os.path.relpath(item, self.sources_path))
-            zip_package.close()
+                    for item in zip_items_abs_paths:
+                        if os.path.isdir(item):
+                            for root, dirs, files in os.walk(item):
+                                for file in files:
+                                    if os.path.islink(os.path.join(root, file)):
+                                        link_dest = os.readlink(os.path.join(root, file))
+                                        zip_package.add_symlink(os.path.relpath(os.path.join(root, file), self.sources_path), link_dest,
+                                                                os.lstat(os.path.join(root, file)).st_mtime)
+                                    else:
+                                        zip_package.add_file(os.path.join(root, file), os.path.relpath(os.path.join(root, file), self.sources_path))
+                        else:
+                            zip_package.add_file(item, os.path.relpath(item, self.sources_path))
+                span.add_bytes(os.path.getsize(staged_zip_path))
+                if zip_package.reused_entries:
+                    LOGGER.info('Reused {} unchanged entries from previous {} package'.format(zip_package.reused_entries, zip_name))
+            self.package_path = zip_path
+            self.package_sha256 = zip_package.sha256
         except Exception as e:
             LOGGER.error('Cannot create zip package {} for {} project'.format(zip_name, self.name))
             raise e
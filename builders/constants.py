@@ -19,9 +19,14 @@ import multiprocessing
 
 # Reading number of processors due to creating threads per processor which runs subprocess commands
 CPU_CORES_COUNT = multiprocessing.cpu_count()
+# Downloading sources is network bound, so more downloads than processors can be in flight
+NETWORK_WORKERS_COUNT = max(8, 2 * CPU_CORES_COUNT)
+# Publishing copies or links packages on local disks, a few workers are enough to keep them busy
+IO_WORKERS_COUNT = 4
 
-ATK_REPOS_URL = 'https://analytics-tool-kit.s3-us-west-2.amazonaws.com/public/weekly/regressed/'
-TAP_REPOS_URL = 'https://github.com/trustedanalytics/'
+# Both locations can be overridden with environment variables, e.g. to build from local mirrors
+ATK_REPOS_URL = os.environ.get('ATK_REPOS_URL', 'https://analytics-tool-kit.s3-us-west-2.amazonaws.com/public/weekly/regressed/')
+TAP_REPOS_URL = os.environ.get('TAP_REPOS_URL', 'https://github.com/trustedanalytics/')
 GEARPUMP_BINARIES_URL = 'https://github.com/gearpump/gearpump/releases/download/{short_ver}/gearpump-{long_ver}.zip'
 
 LATEST_ATK_VERSION = 'latest'
@@ -30,3 +35,14 @@ DEFAULT_ATK_VERSION = LATEST_ATK_VERSION
 PLATFORM_PARENT_PATH = os.getcwd()
 APPS_YAML_FILE_PATH = 'cloud_apps.yml'
 DEFAULT_DESTINATION_PATH = '/tmp/TAP_PACKAGES'
+BUILD_CACHE_PATH = os.path.join(PLATFORM_PARENT_PATH, '.build_cache')
+GIT_MIRRORS_PATH = os.path.join(PLATFORM_PARENT_PATH, '.git_mirrors')
+HTTP_CACHE_PATH = os.path.join(PLATFORM_PARENT_PATH, '.http_cache')
+DOWNLOAD_CACHE_PATH = os.path.join(PLATFORM_PARENT_PATH, '.download_cache')
+TOX_ENVS_PATH = os.path.join(PLATFORM_PARENT_PATH, '.tox_envs')
+DEPENDENCY_CACHE_PATH = os.path.join(PLATFORM_PARENT_PATH, '.dependency_cache')
+BUILD_HISTORY_PATH = os.path.join(PLATFORM_PARENT_PATH, '.build_history.json')
+WORKSPACES_PATH = os.path.join(PLATFORM_PARENT_PATH, '.workspaces')
+GO_WORKSPACES_DIR = '.go_workspaces'
+GO_PKG_CACHE_PATH = os.path.join(PLATFORM_PARENT_PATH, '.go_pkg_cache')
+GO_BUILD_CACHE_PATH = os.path.join(PLATFORM_PARENT_PATH, '.go_build_cache')
@@ -14,34 +14,89 @@
 # limitations under the License.
 #
 
-import subprocess
 import os
+import re
+import glob
+import shutil
+import hashlib
+import subprocess
 
 from builders.builder import Builder
+from lib import processes
 from lib.logger import LOGGER
-from builders.constants import PLATFORM_PARENT_PATH
+from lib.tracing import TRACER
+from builders.constants import GO_WORKSPACES_DIR
+from builders.constants import GO_PKG_CACHE_PATH
+from builders.constants import GO_BUILD_CACHE_PATH
+
+GO_IMPORT_PATH = 'github.com/trustedanalytics'
+GODEPS_MANIFEST_PATH = os.path.join('Godeps', 'Godeps.json')
+PKG_CACHES_TO_KEEP = 3
+# Go versions since 1.10 cache compiled packages by their content in GOCACHE, older ones need them installed in pkgdir
+GO_BUILD_CACHE_VERSION = (1, 10)
 
 class GoBuilder(Builder):
 
     def __init__(self, app_info):
         Builder.__init__(self, app_info)
+        # Every project gets its own GOPATH, so projects can be built in parallel
+        self.gopath = os.path.join(self.workspace_path, GO_WORKSPACES_DIR, self.name)
+        self.import_path = os.path.join(self.gopath, 'src', GO_IMPORT_PATH, self.name)
 
     def build(self):
         LOGGER.info('Building {} project using godep'.format(self.name))
         with open(self.build_log_path, 'a') as build_log, \
                 open(self.err_log_path, 'a') as err_log:
             try:
-                subprocess.check_call(['godep', 'go', 'build', './...'],
-                                      cwd=self.sources_path, stdout=build_log, stderr=err_log)
+                go_version = subprocess.check_output(['go', 'version'])
+                pkg_cache_path = None
+                if self._version_tuple(go_version) < GO_BUILD_CACHE_VERSION:
+                    pkg_cache_path = self._pkg_cache_path(go_version)
+                build_flags = ['-i', '-pkgdir', pkg_cache_path] if pkg_cache_path else []
+                with self.admitted(), TRACER.span('godep-build', app=self.name):
+                    processes.check_call(['godep', 'go', 'build'] + build_flags + ['./...'],
+                                         cwd=self.import_path, env=self._build_env(), stdout=build_log, stderr=err_log)
+                if pkg_cache_path:
+                    self._remove_old_pkg_caches(pkg_cache_path)
             except Exception as e:
                 LOGGER.error('Cannot build {} project using godep'.format(self.name))
                 raise e
         LOGGER.info('Building {} project using godep has been finished'.format(self.name))
 
+    def _build_env(self):
+        env = dict(os.environ)
+        gopath = [os.path.abspath(self.gopath)]
+        if env.get('GOPATH'):
+            gopath.append(env['GOPATH'])
+        env['GOPATH'] = os.pathsep.join(gopath)
+        env['GOCACHE'] = os.path.abspath(GO_BUILD_CACHE_PATH)
+        # Go resolves import path of current directory from PWD, which keeps the symlink
+        env['PWD'] = os.path.abspath(self.import_path)
+        return env
+
+    def _version_tuple(self, go_version):
+        match = re.search(r'go(\d+)\.(\d+)', go_version)
+        return (int(match.group(1)), int(match.group(2))) if match else GO_BUILD_CACHE_VERSION
+
+    def _pkg_cache_path(self, go_version):
+        # Compiled dependencies stay valid as long as Godeps manifest and Go version are the same
+        digest = hashlib.sha256(go_version)
+        godeps_manifest_path = os.path.join(self.sources_path, GODEPS_MANIFEST_PATH)
+        if os.path.exists(godeps_manifest_path):
+            with open(godeps_manifest_path, 'rb') as godeps_manifest:
+                digest.update(godeps_manifest.read())
+        return os.path.abspath(os.path.join(GO_PKG_CACHE_PATH, '{}-{}'.format(self.name, digest.hexdigest()[:16])))
+
+    def _remove_old_pkg_caches(self, pkg_cache_path):
+        if os.path.exists(pkg_cache_path):
+            os.utime(pkg_cache_path, None)
+        pkg_caches = sorted(glob.glob(os.path.join(GO_PKG_CACHE_PATH, self.name + '-*')), key=os.path.getmtime, reverse=True)
+        for old_pkg_cache_path in pkg_caches[PKG_CACHES_TO_KEEP:]:
+            shutil.rmtree(old_pkg_cache_path, ignore_errors=True)
+
     def download_project_sources(self, snapshot=None, url=None):
         Builder.download_project_sources(self, snapshot, url)
-        godep_path = os.path.join(os.environ["GOPATH"], 'src/github.com/trustedanalytics/')
-        if not os.path.exists(godep_path):
-            os.makedirs(godep_path)
-        if not os.path.exists(os.path.join(godep_path, self.name)):
-            os.symlink(os.path.join(PLATFORM_PARENT_PATH, self.name), os.path.join(godep_path, self.name))
\ No newline at end of file
+        if not os.path.exists(os.path.dirname(self.import_path)):
+            os.makedirs(os.path.dirname(self.import_path))
+        if not os.path.lexists(self.import_path):
+            os.symlink(os.path.abspath(self.sources_path), self.import_path)
@@ -15,11 +15,16 @@
 #
 
 import os
-import subprocess
+import hashlib
 
 from constants import PLATFORM_PARENT_PATH
 from constants import TAP_REPOS_URL
+from constants import DOWNLOAD_CACHE_PATH
+from lib.download import download_file_parallel
+from lib.file_lock import file_lock
 from lib.logger import LOGGER
+from lib.publish import publish_file
+from lib.tracing import TRACER
 
 class ReleaseDownloader:
 
@@ -27,9 +32,13 @@ class ReleaseDownloader:
         self.name = app_info['name']
         self.snapshot = app_info.get('snapshot')
         self.url = app_info.get('url')
-        self.sources_path = os.path.join(PLATFORM_PARENT_PATH, self.name)
+        self.sha256 = app_info.get('sha256')
+        self.workspace_path = app_info.get('workspace_path', PLATFORM_PARENT_PATH)
+        self.sources_path = os.path.join(self.workspace_path, self.name)
         self.zip_name = '{}.zip'.format(app_info.get('zip_name', self.name))
-        self.logs_directory_path = os.path.join(PLATFORM_PARENT_PATH, 'logs')
+        self.package_path = None
+        self.package_sha256 = None
+        self.logs_directory_path = os.path.join(self.workspace_path, 'logs')
         if not os.path.exists(self.logs_directory_path):
             os.makedirs(self.logs_directory_path)
         self.build_log_path = os.path.join(self.logs_directory_path, self.name + '-build.log')
@@ -38,13 +47,37 @@ class ReleaseDownloader:
     def download_release_zip(self, dest_path):
         if not self.url:
             LOGGER.error('Not specified release url for %s', self.name)
-            raise 'Not specified release url for {}'.format(self.name)
-        LOGGER.info('Downloading release package for %s from %s', self.name, self.url)
-        with open(self.build_log_path, 'a') as build_log, \
-                open(self.err_log_path, 'a') as err_log:
-            try:
-                subprocess.check_call(['wget', '-O', os.path.join(dest_path, '{}.zip'.format(self.name)), self.url], stdout=build_log, stderr=err_log)
-            except Exception as e:
-                LOGGER.error('Cannot download release package for %s project', self.name)
-                raise e
+            raise ValueError('Not specified release url for {}'.format(self.name))
+        zip_path = os.path.join(dest_path, '{}.zip'.format(self.name))
+        cache_entry_path = os.path.join(DOWNLOAD_CACHE_PATH, hashlib.sha1('{} {}'.format(self.url, self.snapshot)).hexdigest())
+        cached_zip_path = os.path.join(cache_entry_path, os.path.basename(zip_path))
+        if not os.path.exists(cache_entry_path):
+            os.makedirs(cache_entry_path)
+        try:
+            # Builds of other workspaces share the cache entry, so it is downloaded and published by one of them at a time
+            with file_lock(cache_entry_path + '.lock'):
+                # Packages of pinned releases never change, so they are downloaded only once
+                if self.snapshot and self._is_cached(cached_zip_path):
+                    LOGGER.info('Using cached release package for %s in version %s', self.name, self.snapshot)
+                else:
+                    LOGGER.info('Downloading release package for %s from %s', self.name, self.url)
+                    with TRACER.span('download', app=self.name) as span:
+                        digest = download_file_parallel(self.url, cached_zip_path, sha256=self.sha256)
+                        span.add_bytes(os.path.getsize(cached_zip_path))
+                    with open(cached_zip_path + '.sha256', 'w') as digest_file:
+                        digest_file.write(digest)
+                with open(cached_zip_path + '.sha256', 'r') as digest_file:
+                    self.package_sha256 = digest_file.read().strip()
+                self.package_path = publish_file(cached_zip_path, dest_path)
+        except Exception as e:
+            LOGGER.error('Cannot download release package for %s project', self.name)
+            raise e
         LOGGER.info('Release package has been downloaded for %s project', self.name)
+
+    def _is_cached(self, cached_zip_path):
+        if not os.path.exists(cached_zip_path) or not os.path.exists(cached_zip_path + '.sha256'):
+            return False
+        if not self.sha256:
+            return True
+        with open(cached_zip_path + '.sha256', 'r') as digest_file:
+            return digest_file.read().strip() == self.sha256.lower()
@@ -14,10 +14,17 @@
 # limitations under the License.
 #
 
-import subprocess
+import os
 
 from builders.builder import Builder
+from builders.constants import DEPENDENCY_CACHE_PATH
+from lib import processes
+from lib.dependency_cache import DependencyCache
 from lib.logger import LOGGER
+from lib.tracing import TRACER
+
+# Maven and npm dependencies of all projects are kept in one cache, which outlives the build container
+DEPENDENCY_CACHE = DependencyCache(DEPENDENCY_CACHE_PATH)
 
 class UniversalBuilder(Builder):
 
@@ -26,9 +33,32 @@ class UniversalBuilder(Builder):
         with open(self.build_log_path, 'a') as build_log, \
                 open(self.err_log_path, 'a') as err_log:
             try:
-                subprocess.check_call(['sh', 'pack.sh'], cwd=self.sources_path,
-                                      stdout=build_log, stderr=err_log)
+                with self.admitted(), TRACER.span('pack.sh', app=self.name):
+                    processes.check_call(['sh', 'pack.sh'], cwd=self.sources_path, env=DEPENDENCY_CACHE.env(),
+                                         stdout=build_log, stderr=err_log)
             except Exception as e:
                 LOGGER.error('Cannot build {} project'.format(self.name))
                 raise e
         LOGGER.info('Building {} project has been finished'.format(self.name))
+
+    def prefetch_dependencies(self):
+        commands = []
+        if os.path.exists(os.path.join(self.sources_path, 'pom.xml')):
+            commands.append(['mvn', '--batch-mode', 'dependency:go-offline'])
+        if os.path.exists(os.path.join(self.sources_path, 'package.json')):
+            commands.append(['npm', 'install', '--ignore-scripts'])
+        if not commands or DEPENDENCY_CACHE.offline:
+            return
+        LOGGER.info('Prefetching dependencies of %s project', self.name)
+        with open(self.build_log_path, 'a') as build_log, \
+                open(self.err_log_path, 'a') as err_log:
+            for command in commands:
+                try:
+                    with TRACER.span('prefetch-' + command[0], app=self.name):
+                        processes.check_call(command, cwd=self.sources_path, env=DEPENDENCY_CACHE.env(),
+                                             stdout=build_log, stderr=err_log)
+                except processes.CancelledError:
+                    raise
+                except Exception as e:
+                    # Build resolves whatever is missing on its own, so only time is lost
+                    LOGGER.warning('Cannot prefetch dependencies of %s project with %s: %s', self.name, command[0], e)
@@ -0,0 +1,114 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import threading
+import multiprocessing
+
+from contextlib import contextmanager
+from lib.logger import LOGGER
+from lib.tracing import TRACER
+
+DEFAULT_BUILD_CORES = 1
+DEFAULT_BUILD_MEMORY_MB = 1024
+# Builds are admitted while 1-minute load average stays below this many runnable processes per core
+MAX_LOAD_PER_CORE = 1.5
+# Memory left for the system and page cache, never promised to builds
+MEMORY_RESERVE_MB = 512
+# Live load and memory are sampled again after this many seconds when a build waits for admission
+POLL_INTERVAL = 2
+
+
+def _memory_available_mb():
+    try:
+        with open('/proc/meminfo', 'r') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except IOError:
+        pass
+    return None
+
+
+def _memory_total_mb():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024 * 1024)
+    except (ValueError, OSError):
+        return None
+
+
+def _load_average():
+    try:
+        return os.getloadavg()[0]
+    except OSError:
+        return None
+
+
+class AdmissionController(object):
+
+    def __init__(self, cores, memory_mb=None):
+        self.cores = cores
+        self.total_memory_mb = _memory_total_mb()
+        self.memory_mb = memory_mb if memory_mb else self.total_memory_mb
+        self._condition = threading.Condition()
+        self._reserved_cores = 0
+        self._reserved_memory_mb = 0
+        self._running = 0
+
+    def _can_admit(self, cores, memory_mb):
+        # A single build is always admitted, otherwise a build bigger than the machine would wait forever
+        if self._running == 0:
+            return True
+        if self._reserved_cores + cores > self.cores:
+            return False
+        if self.memory_mb and self._reserved_memory_mb + memory_mb > self.memory_mb - MEMORY_RESERVE_MB:
+            return False
+        # Reservations are only hints, so live usage has to confirm there is room for one more build
+        load = _load_average()
+        if load is not None and load + cores > self.cores * MAX_LOAD_PER_CORE:
+            return False
+        memory_available_mb = _memory_available_mb()
+        if memory_available_mb is not None and memory_available_mb - memory_mb < MEMORY_RESERVE_MB:
+            return False
+        return True
+
+    @contextmanager
+    def admit(self, name, cores=None, memory_mb=None):
+        cores = min(cores if cores else DEFAULT_BUILD_CORES, self.cores)
+        memory_mb = memory_mb if memory_mb else DEFAULT_BUILD_MEMORY_MB
+        with TRACER.span('admission', app=name), self._condition:
+            waited = False
+            while not self._can_admit(cores, memory_mb):
+                if not waited:
+                    LOGGER.info('Build of %s project (%s cores, %s MB) is waiting for resources, %s builds running',
+                                name, cores, memory_mb, self._running)
+                    waited = True
+                self._condition.wait(POLL_INTERVAL)
+            self._reserved_cores += cores
+            self._reserved_memory_mb += memory_mb
+            self._running += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._reserved_cores -= cores
+                self._reserved_memory_mb -= memory_mb
+                self._running -= 1
+                self._condition.notify_all()
+
+
+ADMISSION = AdmissionController(multiprocessing.cpu_count())
@@ -0,0 +1,91 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+from lib.logger import LOGGER
+from lib.publish import link_or_copy
+from lib.publish import publish_file
+
+# Bump when the layout of cache entries or the meaning of the key changes
+CACHE_FORMAT_VERSION = 1
+
+# Application entry fields which are resolved at run time and must not be a part of the key
+VOLATILE_APP_FIELDS = ('snapshot', 'git_mirrors_path', 'resources', 'required', 'workspace_path')
+
+
+class BuildCache(object):
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        if not os.path.exists(self.cache_path):
+            os.makedirs(self.cache_path)
+
+    def key(self, app_info, ref):
+        app_entry = dict((k, v) for k, v in app_info.iteritems() if k not in VOLATILE_APP_FIELDS)
+        key_source = json.dumps({'version': CACHE_FORMAT_VERSION, 'app': app_entry, 'ref': ref}, sort_keys=True)
+        return '{}-{}'.format(app_info['name'], hashlib.sha256(key_source).hexdigest())
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_path, key)
+
+    def _read_meta(self, key):
+        meta_path = os.path.join(self._entry_path(key), 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, 'r') as meta_file:
+                meta = json.load(meta_file)
+        except (IOError, ValueError):
+            LOGGER.warning('Ignoring corrupted build cache entry %s', key)
+            return None
+        if not os.path.isfile(os.path.join(self._entry_path(key), meta['zip_name'])):
+            return None
+        return meta
+
+    def lookup(self, key):
+        meta = self._read_meta(key)
+        return os.path.join(self._entry_path(key), meta['zip_name']) if meta else None
+
+    def restore(self, key, dest_path):
+        cached_zip_path = self.lookup(key)
+        if not cached_zip_path:
+            return None
+        return publish_file(cached_zip_path, dest_path)
+
+    def digest(self, key):
+        meta = self._read_meta(key)
+        return meta.get('sha256') if meta else None
+
+    def store(self, key, zip_path, ref=None, sha256=None):
+        entry_path = self._entry_path(key)
+        if os.path.exists(entry_path):
+            shutil.rmtree(entry_path)
+        staging_path = tempfile.mkdtemp(prefix='.{}-'.format(key), dir=self.cache_path)
+        try:
+            zip_name = os.path.basename(zip_path)
+            # Packages may be rewritten in place by the next build, so the cache never shares their inode
+            link_or_copy(zip_path, os.path.join(staging_path, zip_name), allow_hardlink=False)
+            with open(os.path.join(staging_path, 'meta.json'), 'w') as meta_file:
+                json.dump({'zip_name': zip_name, 'ref': ref, 'sha256': sha256}, meta_file)
+            os.rename(staging_path, entry_path)
+        except Exception as e:
+            shutil.rmtree(staging_path, ignore_errors=True)
+            LOGGER.warning('Cannot store %s in build cache: %s', zip_path, e)
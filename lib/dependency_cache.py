@@ -0,0 +1,73 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import threading
+
+from distutils.spawn import find_executable
+
+MVN_WRAPPER_TEMPLATE = '''#!/bin/sh
+exec {mvn} --offline "$@"
+'''
+
+
+class DependencyCache(object):
+
+    def __init__(self, cache_path, offline=False):
+        self.cache_path = cache_path
+        self.offline = offline
+        self._wrappers = None
+        self._wrappers_lock = threading.Lock()
+
+    def maven_repository_path(self):
+        return os.path.abspath(os.path.join(self.cache_path, 'maven'))
+
+    def npm_cache_path(self):
+        return os.path.abspath(os.path.join(self.cache_path, 'npm'))
+
+    def _wrappers_path(self):
+        # Offline mode cannot be turned on with a property, so mvn on PATH is replaced with a wrapper adding --offline
+        with self._wrappers_lock:
+            if self._wrappers is None:
+                self._wrappers = ''
+                wrappers_path = os.path.abspath(os.path.join(self.cache_path, 'bin'))
+                mvn_path = find_executable('mvn')
+                if mvn_path:
+                    if not os.path.exists(wrappers_path):
+                        os.makedirs(wrappers_path)
+                    wrapper_path = os.path.join(wrappers_path, 'mvn')
+                    with open(wrapper_path + '.tmp', 'w') as wrapper:
+                        wrapper.write(MVN_WRAPPER_TEMPLATE.format(mvn=mvn_path))
+                    os.chmod(wrapper_path + '.tmp', 0755)
+                    os.rename(wrapper_path + '.tmp', wrapper_path)
+                    self._wrappers = wrappers_path
+            return self._wrappers
+
+    def env(self, base_env=None):
+        env = dict(base_env if base_env is not None else os.environ)
+        # Repositories from settings.xml stay in use, only location of downloaded artifacts is changed
+        maven_opts = env.get('MAVEN_OPTS', '')
+        env['MAVEN_OPTS'] = '{} -Dmaven.repo.local={}'.format(maven_opts, self.maven_repository_path()).strip()
+        env['npm_config_cache'] = self.npm_cache_path()
+        if self.offline:
+            env['npm_config_offline'] = 'true'
+            # Older npm versions have no offline mode, but do not revalidate cached packages younger than that
+            env['npm_config_cache_min'] = '9999999'
+            wrappers_path = self._wrappers_path()
+            if wrappers_path:
+                env['PATH'] = os.pathsep.join([wrappers_path, env.get('PATH', '')])
+        return env
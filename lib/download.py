@@ -0,0 +1,287 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import hashlib
+import tarfile
+import requests
+import threading
+
+from lib import http_client
+from lib.logger import LOGGER
+
+CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = http_client.HTTP_TIMEOUT
+RESUME_ATTEMPTS = 5
+PARALLEL_PARTS = 4
+MIN_PART_SIZE = 8 * 1024 * 1024
+
+
+class ChecksumError(Exception):
+    pass
+
+
+class IncompleteDownloadError(IOError):
+    pass
+
+
+TRANSIENT_ERRORS = (requests.exceptions.ConnectionError,
+                    requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout,
+                    IncompleteDownloadError)
+
+
+class _HashingReader(object):
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self._stream.read(size) if size >= 0 else self._stream.read()
+        self.digest.update(data)
+        self.size += len(data)
+        return data
+
+
+def _verify_checksum(url, digest, sha256):
+    if sha256 and digest.hexdigest() != sha256.lower():
+        raise ChecksumError('Checksum mismatch for {}: expected {}, got {}'.format(url, sha256, digest.hexdigest()))
+
+
+def _check_complete(url, response):
+    expected_size = response.headers.get('Content-Length')
+    if expected_size is not None and response.raw.tell() < int(expected_size):
+        raise IncompleteDownloadError('Connection closed after {} of {} bytes of {}'
+                                      .format(response.raw.tell(), expected_size, url))
+
+
+def _hash_file(path, digest):
+    with open(path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+
+def download_file(url, dest_path, sha256=None, attempts=RESUME_ATTEMPTS, timeout=DOWNLOAD_TIMEOUT):
+    partial_path = dest_path + '.part'
+    validator_path = partial_path + '.validator'
+    while True:
+        offset = 0
+        headers = {}
+        if os.path.exists(partial_path) and os.path.exists(validator_path):
+            # Resume only if the remote file has not changed since the partial file was written
+            with open(validator_path, 'r') as validator_file:
+                headers['If-Range'] = validator_file.read()
+            offset = os.path.getsize(partial_path)
+            headers['Range'] = 'bytes={}-'.format(offset)
+        digest = hashlib.sha256()
+        try:
+            response = http_client.get(url, headers=headers, stream=True, timeout=timeout)
+            if offset and response.status_code == 416:
+                # Partial file is already complete
+                response.close()
+                _hash_file(partial_path, digest)
+                break
+            response.raise_for_status()
+            if offset and response.status_code == 206 \
+                    and response.headers.get('Content-Range', '').startswith('bytes {}-'.format(offset)):
+                LOGGER.info('Resuming download of %s from byte %s', url, offset)
+                _hash_file(partial_path, digest)
+                mode = 'ab'
+            else:
+                mode = 'wb'
+                validator = response.headers.get('ETag', response.headers.get('Last-Modified'))
+                if validator:
+                    with open(validator_path, 'w') as validator_file:
+                        validator_file.write(validator)
+                elif os.path.exists(validator_path):
+                    os.remove(validator_path)
+            with open(partial_path, mode) as partial_file:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    digest.update(chunk)
+                    partial_file.write(chunk)
+            _check_complete(url, response)
+            break
+        except TRANSIENT_ERRORS as e:
+            attempts -= 1
+            if attempts <= 0:
+                raise e
+            LOGGER.warning('Download of %s interrupted due to %s, retrying', url, e)
+
+    try:
+        _verify_checksum(url, digest, sha256)
+    except ChecksumError:
+        os.remove(partial_path)
+        raise
+    os.rename(partial_path, dest_path)
+    if os.path.exists(validator_path):
+        os.remove(validator_path)
+    return digest.hexdigest()
+
+
+class _SequentialHasher(object):
+    # Hashes a file written by parallel range requests, following the writers as soon as the beginning of the
+    # file is complete, so the file does not have to be read again after the download
+
+    def __init__(self, path, parts):
+        self.digest = hashlib.sha256()
+        self._path = path
+        self._parts = parts
+        self._positions = [start for start, end in parts]
+        self._hashed = 0
+        self._stopped = False
+        self.error = None
+        self._condition = threading.Condition()
+
+    def advance(self, index, position):
+        with self._condition:
+            self._positions[index] = position
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _written(self):
+        for (start, end), position in zip(self._parts, self._positions):
+            if position <= end:
+                return position
+        return self._parts[-1][1] + 1
+
+    def run(self):
+        try:
+            self._hash()
+        except (IOError, OSError) as e:
+            self.error = e
+
+    def _hash(self):
+        size = self._parts[-1][1] + 1
+        with open(self._path, 'rb') as stream:
+            while self._hashed < size:
+                with self._condition:
+                    while self._written() == self._hashed and not self._stopped:
+                        self._condition.wait()
+                    if self._stopped:
+                        return
+                    written = self._written()
+                stream.seek(self._hashed)
+                while self._hashed < written:
+                    chunk = stream.read(min(CHUNK_SIZE, written - self._hashed))
+                    self.digest.update(chunk)
+                    self._hashed += len(chunk)
+
+
+def _download_range(url, path, start, end, attempts, timeout, progress=None):
+    while True:
+        position = start
+        try:
+            response = http_client.get(url, headers={'Range': 'bytes={}-{}'.format(start, end)}, stream=True, timeout=timeout)
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise IOError('Server does not support range requests for {}'.format(url))
+            with open(path, 'r+b') as partial_file:
+                partial_file.seek(start)
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    partial_file.write(chunk)
+                    position += len(chunk)
+                    if progress:
+                        partial_file.flush()
+                        progress(position)
+            if position != end + 1:
+                raise IncompleteDownloadError('Connection closed after {} of {} bytes of {}'
+                                              .format(position - start, end + 1 - start, url))
+            return
+        except TRANSIENT_ERRORS as e:
+            attempts -= 1
+            if attempts <= 0:
+                raise e
+            LOGGER.warning('Download of %s interrupted due to %s, retrying from byte %s', url, e, position)
+            start = position
+
+
+def download_file_parallel(url, dest_path, sha256=None, parts=PARALLEL_PARTS, attempts=RESUME_ATTEMPTS,
+                           timeout=DOWNLOAD_TIMEOUT):
+    response = http_client.head(url, timeout=timeout)
+    size = int(response.headers.get('Content-Length', 0))
+    parts = min(parts, size // MIN_PART_SIZE)
+    if response.status_code != 200 or response.headers.get('Accept-Ranges') != 'bytes' or parts < 2:
+        return download_file(url, dest_path, sha256=sha256, attempts=attempts, timeout=timeout)
+
+    # Redirects (e.g. from GitHub releases to S3) are resolved once, not by every part
+    url = response.url
+    partial_path = dest_path + '.part'
+    with open(partial_path, 'wb') as partial_file:
+        partial_file.truncate(size)
+
+    errors = []
+    part_size = size // parts
+    bounds = [(i * part_size, size - 1 if i == parts - 1 else (i + 1) * part_size - 1) for i in range(parts)]
+    hasher = _SequentialHasher(partial_path, bounds)
+
+    def download_part(index, start, end):
+        try:
+            _download_range(url, partial_path, start, end, attempts, timeout,
+                            progress=lambda position: hasher.advance(index, position))
+        except Exception as e:
+            errors.append(e)
+            hasher.stop()
+
+    hasher_thread = threading.Thread(target=hasher.run)
+    hasher_thread.start()
+    workers = []
+    for index, (start, end) in enumerate(bounds):
+        worker = threading.Thread(target=download_part, args=(index, start, end))
+        worker.start()
+        workers.append(worker)
+    for worker in workers:
+        worker.join()
+    hasher_thread.join()
+    if errors or hasher.error:
+        os.remove(partial_path)
+        raise errors[0] if errors else hasher.error
+
+    digest = hasher.digest
+    try:
+        _verify_checksum(url, digest, sha256)
+    except ChecksumError:
+        os.remove(partial_path)
+        raise
+    os.rename(partial_path, dest_path)
+    return digest.hexdigest()
+
+
+def extract_tar_stream(url, dest_path, sha256=None, timeout=DOWNLOAD_TIMEOUT):
+    response = http_client.get(url, stream=True, timeout=timeout)
+    response.raise_for_status()
+    reader = _HashingReader(response.raw)
+    try:
+        tar = tarfile.open(fileobj=reader, mode='r|*')
+        tar.extractall(dest_path)
+        tar.close()
+        # Read remaining padding, so the checksum covers the whole archive
+        for chunk in iter(lambda: reader.read(CHUNK_SIZE), b''):
+            pass
+        _check_complete(url, response)
+        _verify_checksum(url, reader.digest, sha256)
+    except ChecksumError:
+        shutil.rmtree(dest_path, ignore_errors=True)
+        raise
+    finally:
+        response.close()
+    return reader.size
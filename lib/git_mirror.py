@@ -0,0 +1,141 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import re
+import shutil
+import hashlib
+import subprocess
+import threading
+
+from contextlib import contextmanager
+from lib import processes
+from lib.file_lock import file_lock
+from lib.logger import LOGGER
+
+_mirror_locks = {}
+_mirror_locks_lock = threading.Lock()
+
+
+def _mirror_lock(mirror_path):
+    with _mirror_locks_lock:
+        return _mirror_locks.setdefault(mirror_path, threading.Lock())
+
+
+@contextmanager
+def _locked_mirror(mirror_path):
+    # Threads of this process are serialized first, then builds of other workspaces with a lock file
+    with _mirror_lock(mirror_path), file_lock(mirror_path + '.lock'):
+        yield
+
+
+COMMIT_ID_PATTERN = re.compile('^[0-9a-f]{40}$')
+
+
+def resolve_remote(url, revision):
+    # Resolves branch or tag with a single ls-remote, without fetching any objects
+    if COMMIT_ID_PATTERN.match(revision):
+        return revision
+    output = subprocess.check_output(['git', 'ls-remote', url, revision, revision + '^{}'])
+    refs = dict((ref, commit) for commit, ref in (line.split('\t') for line in output.splitlines() if line))
+    for ref in ('refs/tags/{}^{{}}'.format(revision), 'refs/heads/{}'.format(revision), 'refs/tags/{}'.format(revision)):
+        if ref in refs:
+            return refs[ref]
+    return None
+
+
+class GitMirrorCache(object):
+
+    def __init__(self, cache_path, fetch_depth=1):
+        self.cache_path = cache_path
+        self.fetch_depth = fetch_depth
+
+    def mirror_path(self, url):
+        repo_name = url.rstrip('/').split('/')[-1]
+        if repo_name.endswith('.git'):
+            repo_name = repo_name[:-len('.git')]
+        return os.path.join(self.cache_path, '{}-{}.git'.format(repo_name, hashlib.sha1(url).hexdigest()[:10]))
+
+    def update(self, url, stdout=None, stderr=None):
+        mirror_path = self.mirror_path(url)
+        with _locked_mirror(mirror_path):
+            if os.path.exists(mirror_path):
+                processes.check_call(['git', 'fetch', '--prune', 'origin'], cwd=mirror_path, stdout=stdout, stderr=stderr)
+            else:
+                staging_path = mirror_path + '.tmp'
+                if os.path.exists(staging_path):
+                    shutil.rmtree(staging_path)
+                processes.check_call(['git', 'clone', '--mirror', url, staging_path], stdout=stdout, stderr=stderr)
+                # Allow working trees to fetch single commits, not only branches and tags
+                subprocess.check_call(['git', 'config', 'uploadpack.allowReachableSHA1InWant', 'true'], cwd=staging_path)
+                # Working trees borrow objects from the mirror, so they must never be pruned from it
+                subprocess.check_call(['git', 'config', 'gc.pruneExpire', 'never'], cwd=staging_path)
+                os.rename(staging_path, mirror_path)
+        return mirror_path
+
+    def resolve(self, url, revision):
+        if not os.path.exists(self.mirror_path(url)):
+            return None
+        try:
+            return subprocess.check_output(['git', 'rev-parse', '--verify', '--quiet', '{}^{{commit}}'.format(revision)],
+                                           cwd=self.mirror_path(url)).strip()
+        except subprocess.CalledProcessError:
+            return None
+
+    def checkout(self, url, revision, work_tree_path, stdout=None, stderr=None):
+        mirror_url = 'file://' + self.mirror_path(url)
+        if os.path.exists(work_tree_path) and os.listdir(work_tree_path) and \
+                not os.path.exists(os.path.join(work_tree_path, '.git')):
+            subprocess.check_call(['git', 'init'], cwd=work_tree_path, stdout=stdout, stderr=stderr)
+            subprocess.check_call(['git', 'remote', 'add', 'origin', mirror_url], cwd=work_tree_path, stdout=stdout, stderr=stderr)
+        elif not os.path.exists(os.path.join(work_tree_path, '.git')):
+            # New working trees share the object store of the mirror instead of copying objects, so every workspace
+            # can have its own checkout of the same project without fetching it again
+            if os.path.exists(work_tree_path):
+                os.rmdir(work_tree_path)
+            subprocess.check_call(['git', 'config', 'gc.pruneExpire', 'never'], cwd=self.mirror_path(url))
+            processes.check_call(['git', 'clone', '--quiet', '--shared', '--no-checkout', self.mirror_path(url), work_tree_path],
+                                 stdout=stdout, stderr=stderr)
+            subprocess.check_call(['git', 'remote', 'set-url', 'origin', mirror_url], cwd=work_tree_path, stdout=stdout, stderr=stderr)
+        else:
+            subprocess.check_call(['git', 'remote', 'set-url', 'origin', mirror_url], cwd=work_tree_path, stdout=stdout, stderr=stderr)
+
+        commit = self.resolve(url, revision)
+        if not commit:
+            raise ValueError('Unknown revision {} in {} repository'.format(revision, url))
+        if self._has_commit(work_tree_path, commit):
+            subprocess.check_call(['git', 'checkout', '--force', commit], cwd=work_tree_path, stdout=stdout, stderr=stderr)
+            return commit
+        try:
+            fetch_depth = ['--depth', str(self.fetch_depth)] if self.fetch_depth else []
+            processes.check_call(['git', 'fetch'] + fetch_depth + ['origin', commit],
+                                 cwd=work_tree_path, stdout=stdout, stderr=stderr)
+        except subprocess.CalledProcessError:
+            # Older git versions cannot fetch a commit by its id, but fetching everything from local mirror is cheap
+            LOGGER.warning('Cannot fetch single commit %s from %s mirror, fetching all refs', commit, url)
+            subprocess.check_call(['git', 'fetch', '--unshallow' if self._is_shallow(work_tree_path) else '--quiet', 'origin',
+                                   '+refs/heads/*:refs/remotes/origin/*', '+refs/tags/*:refs/tags/*'],
+                                  cwd=work_tree_path, stdout=stdout, stderr=stderr)
+        subprocess.check_call(['git', 'checkout', '--force', commit], cwd=work_tree_path, stdout=stdout, stderr=stderr)
+        return commit
+
+    def _has_commit(self, work_tree_path, commit):
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.call(['git', 'cat-file', '-e', '{}^{{commit}}'.format(commit)],
+                                   cwd=work_tree_path, stdout=devnull, stderr=devnull) == 0
+
+    def _is_shallow(self, work_tree_path):
+        return os.path.exists(os.path.join(work_tree_path, '.git', 'shallow'))
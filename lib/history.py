@@ -0,0 +1,136 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import json
+import heapq
+
+from lib.file_lock import file_lock
+from lib.logger import LOGGER
+
+BUILT = 'built'
+CACHED = 'cached'
+SAMPLES_TO_KEEP = 5
+PROGRESS_LOG_INTERVAL = 30
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2.0
+
+
+class BuildHistory(object):
+    # Durations of stages of every project from last runs, separately for projects built and restored from cache
+
+    def __init__(self, path):
+        self.path = path
+        self._apps = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as history_file:
+                return json.load(history_file)['apps']
+        except (IOError, ValueError, KeyError) as e:
+            LOGGER.warning('Cannot read build history %s: %s', self.path, e)
+            return {}
+
+    def estimate(self, app, stage, mode):
+        samples = self._apps.get(app, {}).get(mode, {}).get(stage)
+        if samples:
+            return _median(samples)
+        # Projects without history are expected to take as long as a typical project
+        medians = [_median(modes[mode][stage]) for modes in self._apps.itervalues() if modes.get(mode, {}).get(stage)]
+        return _median(medians) if medians else 0.0
+
+    def record(self, durations):
+        # Other workspaces and shards may record at the same time, so history is re-read under the lock
+        with file_lock(self.path + '.lock'):
+            self._apps = self._load()
+            for app, mode, stages in durations:
+                app_stages = self._apps.setdefault(app, {}).setdefault(mode, {})
+                for stage, duration in stages.iteritems():
+                    app_stages[stage] = (app_stages.get(stage, []) + [duration])[-SAMPLES_TO_KEEP:]
+            with open(self.path + '.tmp', 'w') as history_file:
+                json.dump({'apps': self._apps}, history_file, indent=2, sort_keys=True)
+            os.rename(self.path + '.tmp', self.path)
+
+
+def job_priorities(durations, after):
+    # Priority of a job is its own duration plus the longest chain of jobs waiting for it, so jobs on the critical
+    # path and long jobs start first
+    dependents = dict((name, []) for name in durations)
+    for name, dependencies in after.iteritems():
+        for dependency in dependencies or []:
+            if dependency in dependents:
+                dependents[dependency].append(name)
+    priorities = {}
+
+    def priority(name, visiting):
+        if name not in priorities:
+            visiting = visiting | set([name])
+            chained = [priority(dependent, visiting) for dependent in dependents[name] if dependent not in visiting]
+            priorities[name] = durations[name] + max(chained + [0])
+        return priorities[name]
+
+    for name in durations:
+        priority(name, set())
+    return priorities
+
+
+def predict_makespan(jobs, pool_sizes):
+    # Simulates scheduler with given workers. Jobs map names to dicts with 'stages' list of
+    # (pool, duration, wait_for_dependencies), 'after', 'priority' and optional 'running_for' of the first stage.
+    time = 0.0
+    running = []
+    free_workers = dict(pool_sizes)
+    next_stage = dict((name, 0) for name in jobs)
+    busy = set()
+    for name, job in jobs.iteritems():
+        if job.get('running_for') is not None and job['stages']:
+            pool, duration, wait = job['stages'][0]
+            heapq.heappush(running, (max(0.0, duration - job['running_for']), name))
+            free_workers[pool] -= 1
+            next_stage[name] = 1
+            busy.add(name)
+
+    def finished(name):
+        return next_stage[name] == len(jobs[name]['stages']) and name not in busy
+
+    while True:
+        ready = [name for name in jobs if name not in busy and next_stage[name] < len(jobs[name]['stages'])]
+        for name in sorted(ready, key=lambda name: -jobs[name]['priority']):
+            pool, duration, wait = jobs[name]['stages'][next_stage[name]]
+            if free_workers.get(pool, 0) < 1:
+                continue
+            if wait and not all(finished(dependency) for dependency in jobs[name].get('after') or [] if dependency in jobs):
+                continue
+            heapq.heappush(running, (time + duration, name))
+            free_workers[pool] -= 1
+            next_stage[name] += 1
+            busy.add(name)
+        if not running:
+            return time
+        time, name = heapq.heappop(running)
+        busy.remove(name)
+        free_workers[jobs[name]['stages'][next_stage[name] - 1][0]] += 1
+
+
+def format_duration(seconds):
+    return '{}m {:02d}s'.format(int(seconds) // 60, int(seconds) % 60)
@@ -0,0 +1,124 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+
+from requests.adapters import HTTPAdapter
+from lib.logger import LOGGER
+
+# (connect, read) timeouts in seconds, so a stalled server cannot block a worker forever
+HTTP_TIMEOUT = (10, 60)
+CONNECTION_POOL_SIZE = 32
+
+_session = None
+_session_lock = threading.Lock()
+
+_cached_responses = {}
+_cached_responses_lock = threading.Lock()
+_url_locks = {}
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=CONNECTION_POOL_SIZE, pool_maxsize=CONNECTION_POOL_SIZE)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def get(url, **kwargs):
+    kwargs.setdefault('timeout', HTTP_TIMEOUT)
+    return get_session().get(url, **kwargs)
+
+
+def head(url, **kwargs):
+    kwargs.setdefault('timeout', HTTP_TIMEOUT)
+    kwargs.setdefault('allow_redirects', True)
+    return get_session().head(url, **kwargs)
+
+
+def expire_cached_responses(max_age):
+    # Long-running processes revalidate cached responses once they get older than max_age seconds
+    with _cached_responses_lock:
+        for url, (fetched, text) in _cached_responses.items():
+            if time.time() - fetched > max_age:
+                del _cached_responses[url]
+
+
+def _url_lock(url):
+    with _cached_responses_lock:
+        return _url_locks.setdefault(url, threading.Lock())
+
+
+def _read_cache_entry(entry_path):
+    if not os.path.exists(entry_path):
+        return None
+    try:
+        with open(entry_path, 'r') as entry_file:
+            return json.load(entry_file)
+    except (IOError, ValueError):
+        return None
+
+
+def _write_cache_entry(entry_path, entry):
+    if not os.path.exists(os.path.dirname(entry_path)):
+        os.makedirs(os.path.dirname(entry_path))
+    with open(entry_path + '.tmp', 'w') as entry_file:
+        json.dump(entry, entry_file)
+    os.rename(entry_path + '.tmp', entry_path)
+
+
+def get_cached_text(url, cache_path):
+    # Fetched once per run, revalidated against the disk cache and served from it when the network is down
+    with _url_lock(url):
+        if url in _cached_responses:
+            return _cached_responses[url][1]
+
+        entry_path = os.path.join(cache_path, hashlib.sha1(url).hexdigest() + '.json')
+        entry = _read_cache_entry(entry_path)
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = get(url, headers=headers)
+            if response.status_code == 304 and entry:
+                text = entry['body']
+            else:
+                response.raise_for_status()
+                text = response.text
+                _write_cache_entry(entry_path, {'etag': response.headers.get('ETag'),
+                                                'last_modified': response.headers.get('Last-Modified'),
+                                                'body': text})
+        except requests.exceptions.RequestException as e:
+            if not entry:
+                raise e
+            LOGGER.warning('Cannot get %s due to %s. Using cached copy.', url, e)
+            text = entry['body']
+
+        with _cached_responses_lock:
+            _cached_responses[url] = (time.time(), text)
+        return text
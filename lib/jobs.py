@@ -0,0 +1,163 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import time
+import logging
+import threading
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from lib.logger import LOGGER
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED_JOBS_TO_KEEP = 100
+
+_thread_state = threading.local()
+
+
+@contextmanager
+def outside_jobs():
+    # Messages logged by this thread, e.g. while serving requests, do not belong to the running job
+    _thread_state.outside_jobs = True
+    try:
+        yield
+    finally:
+        _thread_state.outside_jobs = False
+
+
+class Job(object):
+
+    def __init__(self, job_id, key, argv):
+        self.id = job_id
+        self.key = key
+        self.argv = argv
+        self.status = QUEUED
+        self.return_code = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.requests = 1
+        self._lines = []
+        self._condition = threading.Condition()
+
+    def done(self):
+        return self.status in (SUCCEEDED, FAILED)
+
+    def append_line(self, line):
+        with self._condition:
+            self._lines.append(line)
+            self._condition.notify_all()
+
+    def finish(self, return_code):
+        with self._condition:
+            self.return_code = return_code
+            self.status = SUCCEEDED if return_code == 0 else FAILED
+            self.finished = time.time()
+            self._condition.notify_all()
+
+    def wait_for_lines(self, offset, timeout):
+        # Returns log lines after offset, waiting for new ones while the job is not done
+        with self._condition:
+            if offset >= len(self._lines) and not self.done():
+                self._condition.wait(timeout)
+            return self._lines[offset:]
+
+    def to_dict(self):
+        return {'id': self.id, 'status': self.status, 'return_code': self.return_code, 'args': self.argv,
+                'submitted': self.submitted, 'started': self.started, 'finished': self.finished,
+                'requests': self.requests, 'log_lines': len(self._lines)}
+
+
+class _JobLogHandler(logging.Handler):
+
+    def __init__(self, job):
+        logging.Handler.__init__(self, logging.INFO)
+        self.job = job
+        self.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    def emit(self, record):
+        # Handler is attached to the global logger, records of the job come from all threads except the outside ones
+        if not getattr(_thread_state, 'outside_jobs', False):
+            self.job.append_line(self.format(record))
+
+
+class JobQueue(object):
+
+    def __init__(self, run_job):
+        self.run_job = run_job
+        self._jobs = OrderedDict()
+        self._queue = []
+        self._condition = threading.Condition()
+        self._next_id = 1
+
+    def submit(self, key, argv):
+        # Request for the same build as a queued or running job joins it instead of building again
+        with self._condition:
+            for job in self._jobs.itervalues():
+                if job.key == key and not job.done():
+                    job.requests += 1
+                    return job, False
+            job = Job(str(self._next_id), key, argv)
+            self._next_id += 1
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            self._remove_old_jobs()
+            self._condition.notify_all()
+            return job, True
+
+    def get(self, job_id):
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._condition:
+            return list(self._jobs.itervalues())
+
+    def start(self):
+        worker = threading.Thread(target=self._work, name='job-worker')
+        worker.daemon = True
+        worker.start()
+        return worker
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                job = self._queue.pop(0)
+                job.status = RUNNING
+                job.started = time.time()
+            LOGGER.info('Starting build job %s: %s', job.id, ' '.join(job.argv))
+            handler = _JobLogHandler(job)
+            LOGGER.addHandler(handler)
+            try:
+                return_code = self.run_job(job)
+            except Exception as e:
+                LOGGER.exception('Build job %s failed due to %s', job.id, e)
+                return_code = 1
+            finally:
+                LOGGER.removeHandler(handler)
+            job.finish(return_code)
+            LOGGER.info('Build job %s %s in %.1fs', job.id, job.status, job.finished - job.started)
+
+    def _remove_old_jobs(self):
+        finished = [job for job in self._jobs.itervalues() if job.done()]
+        for job in finished[:max(0, len(finished) - FINISHED_JOBS_TO_KEEP)]:
+            del self._jobs[job.id]
@@ -0,0 +1,92 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import json
+import hashlib
+import threading
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_FORMAT_VERSION = 1
+HASH_BUFFER_SIZE = 1024 * 1024
+
+OK = 'ok'
+UNCHANGED = 'unchanged'
+MISSING = 'missing'
+MODIFIED = 'modified'
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as hashed_file:
+        for chunk in iter(lambda: hashed_file.read(HASH_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def manifest_path(destination_path):
+    return os.path.join(destination_path, 'files', MANIFEST_NAME)
+
+
+class ArtifactManifest(object):
+
+    def __init__(self, destination_path):
+        self.destination_path = destination_path
+        self._artifacts = {}
+        self._lock = threading.Lock()
+
+    def record(self, path, sha256=None, app=None):
+        # Digests are passed by writers which computed them while writing, other files are hashed here
+        st = os.stat(path)
+        entry = {'app': app, 'sha256': sha256 if sha256 else file_sha256(path),
+                 'size': st.st_size, 'mtime': st.st_mtime}
+        with self._lock:
+            self._artifacts[os.path.relpath(path, self.destination_path)] = entry
+
+    def update(self, artifacts):
+        with self._lock:
+            self._artifacts.update(artifacts)
+
+    def artifacts(self):
+        with self._lock:
+            return dict(self._artifacts)
+
+    def save(self):
+        path = manifest_path(self.destination_path)
+        with open(path + '.tmp', 'w') as manifest_file:
+            json.dump({'version': MANIFEST_FORMAT_VERSION, 'artifacts': self.artifacts()}, manifest_file,
+                      indent=2, sort_keys=True)
+        os.rename(path + '.tmp', path)
+        return path
+
+
+def load_manifest(destination_path):
+    with open(manifest_path(destination_path), 'r') as manifest_file:
+        return json.load(manifest_file)['artifacts']
+
+
+def verify_artifact(destination_path, relative_path, entry, full=False):
+    path = os.path.join(destination_path, relative_path)
+    if not os.path.isfile(path):
+        return MISSING
+    st = os.stat(path)
+    if st.st_size != entry['size']:
+        return MODIFIED
+    # Files which kept size and modification time of the recorded artifact are not read again
+    if not full and st.st_mtime == entry['mtime']:
+        return UNCHANGED
+    return OK if file_sha256(path) == entry['sha256'] else MODIFIED
@@ -0,0 +1,97 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import re
+import subprocess
+
+from multiprocessing.pool import ThreadPool
+from lib.git_mirror import resolve_remote
+from lib.logger import LOGGER
+
+NEW = 'new'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+UNKNOWN = 'unknown'
+
+# Abbreviated commit ids cannot be resolved remotely, they are resolved after fetching sources
+ABBREVIATED_COMMIT_PATTERN = re.compile('^[0-9a-f]{4,39}$')
+
+
+class PlannedApp(object):
+
+    def __init__(self, name, revision, ref, previous_ref):
+        self.name = name
+        self.revision = revision
+        self.ref = ref
+        self.previous_ref = previous_ref
+        self.cached = False
+
+    def status(self):
+        if not self.ref:
+            return UNKNOWN
+        if not self.previous_ref:
+            return NEW
+        return UNCHANGED if self.ref == self.previous_ref else CHANGED
+
+
+def read_refs(refs_path):
+    refs = {}
+    if os.path.exists(refs_path):
+        with open(refs_path, 'r') as refs_file:
+            for line in refs_file:
+                item = line.split()
+                if len(item) == 2:
+                    refs[item[0]] = item[1]
+    return refs
+
+
+def _resolve(url, revision):
+    # Same fallback as in Builder.download_project_sources, unknown snapshots are built from master
+    try:
+        ref = resolve_remote(url, revision) if revision else None
+        if ref or (revision and ABBREVIATED_COMMIT_PATTERN.match(revision)):
+            return ref
+        return resolve_remote(url, 'master')
+    except (subprocess.CalledProcessError, OSError) as e:
+        LOGGER.warning('Cannot resolve %s in %s due to %s', revision, url, e)
+        return None
+
+
+def make_plan(apps, repos_url, release_tag, previous_refs, workers):
+    # Only projects built from git repositories have refs, atk and release packages are left out
+    git_apps = [app for app in apps if app['builder'] not in ('atk', 'release_downloader')]
+    sources = [(app.get('url') if app.get('url') else os.path.join(repos_url, app['name']),
+                app['snapshot'] if app.get('snapshot') else release_tag) for app in git_apps]
+    pool = ThreadPool(max(1, min(workers, len(sources))))
+    try:
+        refs = pool.map(lambda source: _resolve(*source), sources)
+    finally:
+        pool.close()
+    return [PlannedApp(app['name'], revision, ref, previous_refs.get(app['name']))
+            for app, (url, revision), ref in zip(git_apps, sources, refs)]
+
+
+def log_plan(plan):
+    counts = {}
+    for planned in plan:
+        counts[planned.status()] = counts.get(planned.status(), 0) + 1
+        LOGGER.info('  %-10s %-40s %-12s %s%s', planned.status(), planned.name, planned.revision if planned.revision else 'master',
+                    planned.ref[:12] if planned.ref else '-', ' (cached)' if planned.cached else '')
+    to_build = len([planned for planned in plan if not planned.cached])
+    LOGGER.info('Build plan: %s, %s projects to build', ', '.join('{} {}'.format(counts.get(status, 0), status)
+                                                                  for status in (NEW, CHANGED, UNCHANGED, UNKNOWN)), to_build)
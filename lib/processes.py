@@ -0,0 +1,68 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import signal
+import threading
+import subprocess
+
+_processes = set()
+_processes_lock = threading.Lock()
+_cancelled = threading.Event()
+
+
+class CancelledError(Exception):
+    pass
+
+
+def check_call(args, **kwargs):
+    # Long running commands are registered, so fail-fast mode can stop them together with their children
+    with _processes_lock:
+        if _cancelled.is_set():
+            raise CancelledError('Build has been cancelled, not running {}'.format(' '.join(args)))
+        process = subprocess.Popen(args, preexec_fn=os.setpgrp, **kwargs)
+        _processes.add(process)
+    try:
+        return_code = process.wait()
+    finally:
+        with _processes_lock:
+            _processes.discard(process)
+    if _cancelled.is_set() and return_code:
+        raise CancelledError('Build has been cancelled, {} stopped'.format(' '.join(args)))
+    if return_code:
+        raise subprocess.CalledProcessError(return_code, args)
+    return return_code
+
+
+def is_cancelled():
+    return _cancelled.is_set()
+
+
+def reset():
+    # Processes running many builds, like build daemon, start every build without cancellation of the previous one
+    with _processes_lock:
+        _cancelled.clear()
+
+
+def terminate_all():
+    with _processes_lock:
+        _cancelled.set()
+        for process in _processes:
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except OSError:
+                pass
@@ -0,0 +1,75 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import fcntl
+import shutil
+import tempfile
+
+from contextlib import contextmanager
+
+# ioctl request cloning file contents on copy-on-write filesystems (btrfs, xfs)
+FICLONE = 0x40049409
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def _reflink(src_path, dest_path):
+    with open(src_path, 'rb') as src, open(dest_path, 'wb') as dest:
+        fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+
+
+def link_or_copy(src_path, dest_path, allow_hardlink=True):
+    # Reflinks are preferred, because unlike hardlinks they do not share later modifications
+    try:
+        _reflink(src_path, dest_path)
+        shutil.copymode(src_path, dest_path)
+        return 'reflink'
+    except (IOError, OSError):
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+    if allow_hardlink:
+        try:
+            os.link(src_path, dest_path)
+            return 'hardlink'
+        except OSError:
+            pass
+    with open(src_path, 'rb') as src, open(dest_path, 'wb') as dest:
+        shutil.copyfileobj(src, dest, COPY_BUFFER_SIZE)
+    shutil.copymode(src_path, dest_path)
+    return 'copy'
+
+
+@contextmanager
+def staged_file(dest_path):
+    # Files are written in a hidden staging directory next to the destination and renamed into place,
+    # so readers of the destination directory never see partially written files
+    dest_dir = os.path.dirname(dest_path)
+    if not os.path.exists(dest_dir):
+        os.makedirs(dest_dir)
+    staging_path = tempfile.mkdtemp(prefix='.staging-', dir=dest_dir)
+    try:
+        staged_path = os.path.join(staging_path, os.path.basename(dest_path))
+        yield staged_path
+        os.rename(staged_path, dest_path)
+    finally:
+        shutil.rmtree(staging_path, ignore_errors=True)
+
+
+def publish_file(src_path, dest_dir, name=None):
+    dest_path = os.path.join(dest_dir, name if name else os.path.basename(src_path))
+    with staged_file(dest_path) as staged_path:
+        link_or_copy(src_path, staged_path)
+    return dest_path
@@ -0,0 +1,81 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import time
+import random
+import socket
+import requests
+import subprocess
+
+from lib.download import IncompleteDownloadError
+from lib.logger import LOGGER
+
+# Git exits with 128 on fatal errors, which for these commands are mostly unreachable or dropped remotes
+GIT_NETWORK_COMMANDS = ('fetch', 'clone', 'ls-remote')
+GIT_FATAL_EXIT_CODE = 128
+
+
+def _is_git_network_error(error):
+    command = error.cmd if isinstance(error.cmd, (list, tuple)) else str(error.cmd).split()
+    return len(command) > 1 and command[0] == 'git' and command[1] in GIT_NETWORK_COMMANDS and \
+        error.returncode == GIT_FATAL_EXIT_CODE
+
+
+def is_transient(error):
+    # Only network failures may pass on retry, client errors, missing files and failed builds will not
+    if isinstance(error, requests.exceptions.HTTPError):
+        status_code = error.response.status_code if error.response is not None else None
+        return status_code is None or status_code >= 500 or status_code == 429
+    if isinstance(error, subprocess.CalledProcessError):
+        return _is_git_network_error(error)
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                              requests.exceptions.ChunkedEncodingError, IncompleteDownloadError, socket.error))
+
+
+class RetryPolicy(object):
+
+    def __init__(self, attempts, initial_delay=2, max_delay=60, multiplier=2, retry_if=is_transient):
+        self.attempts = attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.retry_if = retry_if
+
+    def delay(self, attempt):
+        # Full jitter, so workers which failed together do not retry together
+        return random.uniform(0, min(self.max_delay, self.initial_delay * self.multiplier ** (attempt - 1)))
+
+    def call(self, func, description, cancel_event=None):
+        attempt = 1
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                if attempt >= self.attempts or not self.retry_if(e) or (cancel_event and cancel_event.is_set()):
+                    raise
+                delay = self.delay(attempt)
+                LOGGER.warning('%s failed due to %s (attempt %s of %s), retrying in %.1fs',
+                               description, e, attempt, self.attempts, delay)
+                if cancel_event:
+                    if cancel_event.wait(delay):
+                        raise
+                else:
+                    time.sleep(delay)
+                attempt += 1
+
+
+NETWORK_RETRY = RetryPolicy(attempts=4)
@@ -0,0 +1,200 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import time
+import itertools
+import threading
+
+from Queue import PriorityQueue
+from lib import processes
+from lib.logger import LOGGER
+from lib.tracing import TRACER
+from lib.tracing import STAGE_CATEGORY
+
+
+class Stage(object):
+
+    def __init__(self, name, pool, func, wait_for_dependencies=False, retry=None):
+        self.name = name
+        self.pool = pool
+        self.func = func
+        self.wait_for_dependencies = wait_for_dependencies
+        self.retry = retry
+
+
+class Job(object):
+
+    def __init__(self, name, stages, after=None, required=True, priority=0):
+        self.name = name
+        self.stages = stages
+        self.after = list(after) if after else []
+        self.required = required
+        self.priority = priority
+        self.queued = False
+        self.started = None
+        self.next_stage = 0
+        self.done = False
+        self.failed = False
+
+
+class Scheduler(object):
+
+    def __init__(self, pool_sizes, fail_fast=False):
+        self.pool_sizes = pool_sizes
+        self.fail_fast = fail_fast
+        self.cancelled = threading.Event()
+        # Stages with higher priority are taken first, stages with equal priority in order they were queued
+        self._queues = dict((pool, PriorityQueue()) for pool in pool_sizes)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._jobs = {}
+        self._jobs_order = []
+        self._waiting = []
+        self._in_flight = 0
+
+    def add_job(self, name, stages, after=None, required=True, priority=0):
+        for stage in stages:
+            if stage.pool not in self._queues:
+                raise ValueError('Unknown worker pool {} for {} stage of {} job'.format(stage.pool, stage.name, name))
+        job = Job(name, stages, after, required, priority)
+        self._jobs[name] = job
+        self._jobs_order.append(job)
+        return job
+
+    def run(self):
+        for job in self._jobs_order:
+            unknown = [dependency for dependency in job.after if dependency not in self._jobs]
+            if unknown:
+                LOGGER.warning('Ignoring unknown dependencies %s of %s', ', '.join(unknown), job.name)
+                job.after = [dependency for dependency in job.after if dependency in self._jobs]
+
+        # First stages of all jobs are queued before workers start, so they are taken in order of priority
+        with self._condition:
+            for job in self._jobs_order:
+                self._advance(job)
+
+        workers = []
+        for pool, size in self.pool_sizes.iteritems():
+            for i in range(size):
+                worker = threading.Thread(target=self._work, args=(self._queues[pool],),
+                                          name='{}-worker-{}'.format(pool, i))
+                worker.daemon = True
+                worker.start()
+                workers.append(worker)
+
+        with self._condition:
+            while not all(job.done for job in self._jobs_order):
+                if self._in_flight == 0:
+                    self._fail_blocked_jobs()
+                    continue
+                self._condition.wait()
+
+        for pool, queue in self._queues.iteritems():
+            for i in range(self.pool_sizes[pool]):
+                queue.put((float('inf'), next(self._sequence), None))
+        for worker in workers:
+            worker.join()
+
+        return [job.name for job in self._jobs_order if job.failed]
+
+    def remaining(self):
+        # Stages which are not finished yet for every unfinished job, with time the current stage has been running
+        with self._condition:
+            remaining = []
+            for job in self._jobs_order:
+                if job.done:
+                    continue
+                current = job.next_stage - 1 if job.queued or job.started else job.next_stage
+                remaining.append((job, job.stages[current:], time.time() - job.started if job.started else None))
+            return remaining
+
+    def _work(self, queue):
+        while True:
+            task = queue.get()[2]
+            if task is None:
+                return
+            job, stage = task
+            with self._condition:
+                job.queued = False
+                job.started = time.time()
+            try:
+                if self.cancelled.is_set():
+                    raise processes.CancelledError('Build has been cancelled')
+                with TRACER.span(stage.name, app=job.name, category=STAGE_CATEGORY):
+                    if stage.retry:
+                        stage.retry.call(stage.func, '{} stage of {}'.format(stage.name, job.name), self.cancelled)
+                    else:
+                        stage.func()
+                succeeded = True
+            except processes.CancelledError:
+                LOGGER.warning('Building %s has been cancelled (%s stage)', job.name, stage.name)
+                succeeded = False
+            except Exception as e:
+                LOGGER.error('Cannot build %s due to %s (%s stage)', job.name, e, stage.name)
+                succeeded = False
+            with self._condition:
+                self._in_flight -= 1
+                job.started = None
+                if succeeded:
+                    self._advance(job)
+                else:
+                    self._finish(job, failed=True)
+                    if self.fail_fast and job.required and not self.cancelled.is_set():
+                        self._cancel(job)
+                self._condition.notify_all()
+
+    def _advance(self, job):
+        if job.next_stage == len(job.stages):
+            self._finish(job)
+            return
+        if self.cancelled.is_set():
+            self._finish(job, failed=True)
+            return
+        stage = job.stages[job.next_stage]
+        if stage.wait_for_dependencies:
+            dependencies = [self._jobs[name] for name in job.after]
+            failed = [dependency.name for dependency in dependencies if dependency.failed]
+            if failed:
+                LOGGER.error('Cannot build %s because %s failed', job.name, ', '.join(failed))
+                self._finish(job, failed=True)
+                return
+            if not all(dependency.done for dependency in dependencies):
+                self._waiting.append(job)
+                return
+        job.next_stage += 1
+        self._in_flight += 1
+        job.queued = True
+        self._queues[stage.pool].put((-job.priority, next(self._sequence), (job, stage)))
+
+    def _finish(self, job, failed=False):
+        job.done = True
+        job.failed = failed
+        waiting, self._waiting = self._waiting, []
+        for waiting_job in waiting:
+            self._advance(waiting_job)
+
+    def _cancel(self, failed_job):
+        LOGGER.error('Required project %s failed, cancelling remaining builds', failed_job.name)
+        self.cancelled.set()
+        processes.terminate_all()
+
+    def _fail_blocked_jobs(self):
+        # Nothing is running, so jobs which are still waiting have circular dependencies
+        waiting, self._waiting = self._waiting, []
+        for job in waiting:
+            LOGGER.error('Cannot build %s due to circular dependencies on %s', job.name, ', '.join(job.after))
+            job.done = True
+            job.failed = True
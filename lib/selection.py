@@ -0,0 +1,77 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+
+from fnmatch import fnmatch
+from lib.logger import LOGGER
+from lib.manifest import load_manifest
+from lib.plan import read_refs
+from lib.publish import publish_file
+
+
+def dependency_closure(apps, names, dependents=False):
+    # Projects listed in 'after' are built too, and with dependents also projects which are built after them
+    apps_by_name = dict((app['name'], app) for app in apps)
+    closure = set(name for name in names if name in apps_by_name)
+    pending = list(closure)
+    while pending:
+        name = pending.pop()
+        related = [dependency for dependency in apps_by_name[name].get('after') or [] if dependency in apps_by_name]
+        if dependents:
+            related += [app['name'] for app in apps if name in (app.get('after') or [])]
+        for related_name in related:
+            if related_name not in closure:
+                closure.add(related_name)
+                pending.append(related_name)
+    return closure
+
+
+def select_apps(apps, patterns=None, builders=None):
+    names = [app['name'] for app in apps
+             if (not patterns or any(fnmatch(app['name'], pattern) for pattern in patterns))
+             and (not builders or app['builder'] in builders)]
+    closure = dependency_closure(apps, names)
+    return [app for app in apps if app['name'] in closure]
+
+
+def select_changed_apps(apps, plan, previous_refs):
+    # Projects whose ref cannot be resolved up front are treated as changed
+    changed = [planned.name for planned in plan if not planned.ref or previous_refs.get(planned.name) != planned.ref]
+    closure = dependency_closure(apps, changed, dependents=True)
+    return [app for app in apps if app['name'] in closure]
+
+
+def carry_over(previous_path, destination_path, app_names, artifacts):
+    # Packages of projects which are not built are taken from previous output, so it stays complete
+    try:
+        previous_artifacts = load_manifest(previous_path)
+    except (IOError, ValueError, KeyError) as e:
+        LOGGER.warning('Cannot carry over packages from %s: %s', previous_path, e)
+        previous_artifacts = {}
+    same_tree = os.path.realpath(previous_path) == os.path.realpath(destination_path)
+    for relative_path, entry in previous_artifacts.iteritems():
+        if entry.get('app') not in app_names or not os.path.isfile(os.path.join(previous_path, relative_path)):
+            continue
+        if same_tree:
+            artifacts.update({relative_path: entry})
+        else:
+            dest_path = publish_file(os.path.join(previous_path, relative_path),
+                                     os.path.dirname(os.path.join(destination_path, relative_path)))
+            artifacts.record(dest_path, entry['sha256'], entry['app'])
+    previous_refs = read_refs(os.path.join(previous_path, 'files', 'refs.txt'))
+    return dict((name, ref) for name, ref in previous_refs.iteritems() if name in app_names)
@@ -0,0 +1,79 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import json
+
+
+def parse_shard(value):
+    try:
+        index, count = [int(part) for part in value.split('/')]
+    except ValueError:
+        raise ValueError('Shard has to be given as <index>/<count>, got {}'.format(value))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError('Shard index has to be between 0 and {}, got {}'.format(count - 1, index))
+    return index, count
+
+
+def assign_shards(apps, count):
+    # Projects connected with 'after' are kept in one shard, so every shard can be built on its own
+    names = [app['name'] for app in apps]
+    parents = dict((name, name) for name in names)
+
+    def root(name):
+        while parents[name] != name:
+            name = parents[name]
+        return name
+
+    for app in apps:
+        for dependency in app.get('after') or []:
+            if dependency in parents:
+                parents[root(dependency)] = root(app['name'])
+
+    components = {}
+    for name in names:
+        components.setdefault(root(name), []).append(name)
+    shards = [[] for i in range(count)]
+    for component in sorted(components.itervalues(), key=lambda component: (-len(component), names.index(component[0]))):
+        min(shards, key=len).extend(component)
+    return [sorted(shard, key=names.index) for shard in shards]
+
+
+def select_shard(apps, index, count):
+    names = set(assign_shards(apps, count)[index])
+    return [app for app in apps if app['name'] in names]
+
+
+def shard_result_path(files_output_path, index):
+    return os.path.join(files_output_path, 'shard-{}.json'.format(index))
+
+
+def write_shard_result(files_output_path, index, refs, failed, artifacts):
+    result_path = shard_result_path(files_output_path, index)
+    with open(result_path + '.tmp', 'w') as result_file:
+        json.dump({'refs': refs, 'failed': failed, 'artifacts': artifacts}, result_file)
+    os.rename(result_path + '.tmp', result_path)
+
+
+def read_shard_result(files_output_path, index):
+    result_path = shard_result_path(files_output_path, index)
+    if not os.path.exists(result_path):
+        return None
+    with open(result_path, 'r') as result_file:
+        result = json.load(result_file)
+    os.remove(result_path)
+    return result
@@ -0,0 +1,69 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import glob
+import shutil
+import hashlib
+
+from lib import processes
+from lib.file_lock import file_lock
+from lib.logger import LOGGER
+
+# Files which determine what is installed in tox environment
+TOX_ENV_KEY_FILES = ('tox.ini', 'setup.py', 'setup.cfg', 'requirements*.txt')
+TOX_ENVS_TO_KEEP = 3
+READY_MARKER = '.ready'
+
+
+def tox_env_key(project_path, ref):
+    digest = hashlib.sha256(str(ref))
+    for pattern in TOX_ENV_KEY_FILES:
+        for path in sorted(glob.glob(os.path.join(project_path, pattern))):
+            digest.update(os.path.basename(path))
+            with open(path, 'rb') as key_file:
+                digest.update(key_file.read())
+    return digest.hexdigest()
+
+
+def prepare_tox_env(project_path, ref, envs_path, stdout=None, stderr=None):
+    # Environments are kept per requirements and project revision, so unchanged projects skip installation
+    work_dir = os.path.join(envs_path, '{}-{}'.format(os.path.basename(project_path), tox_env_key(project_path, ref)[:16]))
+    with file_lock(work_dir + '.lock'):
+        return _prepare_locked(project_path, work_dir, envs_path, stdout, stderr)
+
+
+def _prepare_locked(project_path, work_dir, envs_path, stdout, stderr):
+    if os.path.exists(os.path.join(work_dir, READY_MARKER)):
+        LOGGER.info('Reusing tox environment %s', work_dir)
+        os.utime(work_dir, None)
+        return work_dir
+    LOGGER.info('Creating tox environment %s', work_dir)
+    # Environment left by interrupted run is recreated from scratch
+    recreate = ['-r'] if os.path.exists(work_dir) else []
+    processes.check_call(['tox', '--notest', '--workdir', work_dir] + recreate, cwd=project_path, stdout=stdout, stderr=stderr)
+    open(os.path.join(work_dir, READY_MARKER), 'w').close()
+    _remove_old_envs(envs_path, os.path.basename(project_path))
+    return work_dir
+
+
+def _remove_old_envs(envs_path, project_name):
+    envs = sorted([path for path in glob.glob(os.path.join(envs_path, project_name + '-*')) if os.path.isdir(path)],
+                  key=os.path.getmtime, reverse=True)
+    for env_path in envs[TOX_ENVS_TO_KEEP:]:
+        LOGGER.info('Removing old tox environment %s', env_path)
+        shutil.rmtree(env_path, ignore_errors=True)
@@ -0,0 +1,156 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import json
+import time
+import threading
+
+from contextlib import contextmanager
+from lib.logger import LOGGER
+
+STAGE_CATEGORY = 'stage'
+STEP_CATEGORY = 'step'
+
+
+class Span(object):
+
+    def __init__(self, name, category, app, thread_name):
+        self.name = name
+        self.category = category
+        self.app = app
+        self.thread_name = thread_name
+        self.start = time.time()
+        self.end = None
+        self.bytes = 0
+        self.failed = False
+
+    def add_bytes(self, count):
+        self.bytes += count
+
+    def duration(self):
+        return self.end - self.start
+
+    def to_dict(self, origin):
+        return {'name': self.name, 'category': self.category, 'app': self.app, 'thread': self.thread_name,
+                'start': round(self.start - origin, 3), 'end': round(self.end - origin, 3),
+                'duration': round(self.duration(), 3), 'bytes': self.bytes, 'failed': self.failed}
+
+
+class Tracer(object):
+
+    def __init__(self):
+        self.origin = time.time()
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.origin = time.time()
+            self._spans = []
+
+    @contextmanager
+    def span(self, name, app=None, category=STEP_CATEGORY):
+        span = Span(name, category, app, threading.current_thread().name)
+        try:
+            yield span
+        except Exception:
+            span.failed = True
+            raise
+        finally:
+            span.end = time.time()
+            with self._lock:
+                self._spans.append(span)
+
+    def spans(self, category=None):
+        with self._lock:
+            return [span for span in self._spans if category is None or span.category == category]
+
+    def critical_path(self):
+        # Walk back from the stage which finished last. Each stage is preceded by the previous stage of the same
+        # application if there is one, otherwise by the stage which finished last before it started, which is
+        # what it was waiting for (a dependency or a free worker).
+        stages = self.spans(STAGE_CATEGORY)
+        if not stages:
+            return []
+        current = max(stages, key=lambda span: span.end)
+        path = [current]
+        while True:
+            earlier = [span for span in stages if span.end <= current.start + 0.001 and span not in path]
+            if not earlier:
+                break
+            same_app = [span for span in earlier if span.app == current.app]
+            current = max(same_app if same_app else earlier, key=lambda span: span.end)
+            path.append(current)
+        return list(reversed(path))
+
+    def summary(self):
+        spans = self.spans()
+        apps = {}
+        steps = {}
+        for span in spans:
+            if span.app:
+                app_summary = apps.setdefault(span.app, {'stages': {}, 'bytes': 0, 'failed': False})
+                app_summary['bytes'] += span.bytes
+            if span.category == STAGE_CATEGORY and span.app:
+                app_summary['stages'][span.name] = round(app_summary['stages'].get(span.name, 0) + span.duration(), 3)
+                app_summary['failed'] = app_summary['failed'] or span.failed
+            else:
+                step_summary = steps.setdefault(span.name, {'count': 0, 'duration': 0, 'bytes': 0})
+                step_summary['count'] += 1
+                step_summary['duration'] = round(step_summary['duration'] + span.duration(), 3)
+                step_summary['bytes'] += span.bytes
+        end = max([span.end for span in spans]) if spans else self.origin
+        return {'wall_time': round(end - self.origin, 3),
+                'apps': apps,
+                'steps': steps,
+                'critical_path': [span.to_dict(self.origin) for span in self.critical_path()]}
+
+    def chrome_trace(self):
+        thread_ids = {}
+        events = []
+        for span in sorted(self.spans(), key=lambda span: span.start):
+            tid = thread_ids.setdefault(span.thread_name, len(thread_ids) + 1)
+            events.append({'name': '{} {}'.format(span.app, span.name) if span.app else span.name,
+                           'cat': span.category, 'ph': 'X', 'pid': 1, 'tid': tid,
+                           'ts': int((span.start - self.origin) * 1000000),
+                           'dur': int(span.duration() * 1000000),
+                           'args': {'app': span.app, 'bytes': span.bytes, 'failed': span.failed}})
+        for thread_name, tid in thread_ids.iteritems():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': thread_name}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, trace_dir):
+        if not os.path.exists(trace_dir):
+            os.makedirs(trace_dir)
+        trace_path = os.path.join(trace_dir, 'build-trace.json')
+        summary_path = os.path.join(trace_dir, 'build-summary.json')
+        with open(trace_path, 'w') as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+        summary = self.summary()
+        with open(summary_path, 'w') as summary_file:
+            json.dump(summary, summary_file, indent=2, sort_keys=True)
+
+        LOGGER.info('Build trace saved in %s, summary in %s', trace_path, summary_path)
+        LOGGER.info('Critical path (%.1fs wall time):', summary['wall_time'])
+        previous_end = 0
+        for span in summary['critical_path']:
+            LOGGER.info('  %8.1fs %-30s %-8s %7.1fs (waited %.1fs)', span['start'], span['app'], span['name'],
+                        span['duration'], max(0, span['start'] - previous_end))
+            previous_end = span['end']
+
+
+TRACER = Tracer()
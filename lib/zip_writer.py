@@ -0,0 +1,372 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import sys
+import time
+import zlib
+import hashlib
+import struct
+import shutil
+import zipfile
+import tempfile
+import threading
+import multiprocessing
+
+from collections import deque
+from Queue import Queue
+
+DEFAULT_COMPRESSION_LEVEL = 6
+
+# Files which are compressed already, deflating them again only costs time
+PRECOMPRESSED_EXTENSIONS = ('.jar', '.war', '.ear', '.zip', '.gz', '.tgz', '.bz2', '.xz', '.whl', '.egg',
+                            '.png', '.jpg', '.jpeg', '.gif', '.woff', '.woff2')
+
+# Entries bigger than that are compressed into temporary files instead of memory
+IN_MEMORY_LIMIT = 8 * 1024 * 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+
+SYMLINK_ATTRIBUTES = 2716663808L  # symlink magic number
+UNIX_SYSTEM = 3  # local system code
+DATA_DESCRIPTOR_FLAG = 0x08
+DATA_DESCRIPTOR_SIGNATURE = 'PK\x07\x08'
+COMPRESSION_LEVEL_COMMENT = 'compression_level={}'
+
+
+class _FileRegion(object):
+
+    def __init__(self, path, offset, size):
+        self._file = open(path, 'rb')
+        self._file.seek(offset)
+        self._remaining = size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._file.close()
+
+    def read(self, size=-1):
+        size = self._remaining if size < 0 else min(size, self._remaining)
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+
+class _HashingWriter(object):
+
+    def __init__(self, path):
+        self._file = open(path, 'wb')
+        self._digest = hashlib.sha256()
+
+    def write(self, data):
+        self._digest.update(data)
+        self._file.write(data)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+
+def _date_time(timestamp):
+    # Zip format cannot store timestamps before 1980, and stores seconds with 2 second resolution
+    date_time = max(time.localtime(timestamp)[0:6], (1980, 1, 1, 0, 0, 0))
+    return date_time[:5] + (date_time[5] // 2 * 2,)
+
+
+def _file_crc(path):
+    crc = 0
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(COPY_BUFFER_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc & 0xffffffff
+
+
+class _Task(object):
+
+    def __init__(self, func, *args):
+        self._func = func
+        self._args = args
+        self._done = threading.Event()
+        self._cancelled = False
+        self._result = None
+        self._error = None
+
+    def run(self):
+        try:
+            if not self._cancelled:
+                self._result = self._func(*self._args)
+        except Exception:
+            self._error = sys.exc_info()
+        finally:
+            self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def cancel(self):
+        self._cancelled = True
+        # Payload which is compressed already is never written, so its temporary file is closed
+        if self.done() and self._result and hasattr(self._result[1], 'close'):
+            self._result[1].close()
+
+    def result(self):
+        self._done.wait()
+        if self._error:
+            raise self._error[0], self._error[1], self._error[2]
+        return self._result
+
+
+class _CompressionPool(object):
+    # Packages of all projects built at the same time share one set of threads, one per processor
+
+    def __init__(self):
+        self.workers = multiprocessing.cpu_count()
+        self._tasks = Queue()
+        self._started = False
+        self._lock = threading.Lock()
+
+    def submit(self, task):
+        with self._lock:
+            if not self._started:
+                for i in range(self.workers):
+                    worker = threading.Thread(target=self._work)
+                    worker.daemon = True
+                    worker.start()
+                self._started = True
+        self._tasks.put(task)
+
+    def _work(self):
+        while True:
+            self._tasks.get().run()
+
+
+COMPRESSION_POOL = _CompressionPool()
+
+
+class ZipWriter(object):
+
+    def __init__(self, path, compression_level=DEFAULT_COMPRESSION_LEVEL, previous_path=None):
+        self.compression_level = compression_level
+        self.reused_entries = 0
+        self.sha256 = None
+        self._previous_path = previous_path
+        self._previous_entries = {}
+        if previous_path and os.path.exists(previous_path):
+            try:
+                previous_zip = zipfile.ZipFile(previous_path, 'r')
+                # Entries compressed with another level would differ from freshly compressed ones, so none are reused
+                if previous_zip.comment == COMPRESSION_LEVEL_COMMENT.format(compression_level):
+                    self._previous_entries = previous_zip.NameToInfo
+                previous_zip.close()
+            except (zipfile.BadZipfile, IOError):
+                self._previous_entries = {}
+        # Package is written strictly sequentially, so its digest is computed on the fly
+        self._output = _HashingWriter(path)
+        self._zip = zipfile.ZipFile(self._output, 'w', allowZip64=True)
+        self._zip.comment = COMPRESSION_LEVEL_COMMENT.format(compression_level)
+        self._pending = deque()
+        self._max_pending = 2 * COMPRESSION_POOL.workers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+    def _submit(self, func, *args):
+        task = _Task(func, *args)
+        self._pending.append(task)
+        COMPRESSION_POOL.submit(task)
+        self._write_finished(wait=len(self._pending) > self._max_pending)
+
+    def _write_finished(self, wait=False):
+        # Entries are written in the order they were added, as soon as they are compressed
+        while self._pending and (wait or self._pending[0].done()):
+            zinfo, payload = self._pending.popleft().result()
+            # Only entries reused from previous package are copied from its regions
+            if isinstance(payload, _FileRegion):
+                self.reused_entries += 1
+            self._write_entry(zinfo, payload)
+            wait = False
+
+    def _write_entry(self, zinfo, payload):
+        zinfo.header_offset = self._zip.fp.tell()
+        self._zip._writecheck(zinfo)
+        self._zip._didModify = True
+        self._zip.fp.write(zinfo.FileHeader())
+        if isinstance(payload, str):
+            self._zip.fp.write(payload)
+        else:
+            with payload:
+                shutil.copyfileobj(payload, self._zip.fp, COPY_BUFFER_SIZE)
+        self._zip.filelist.append(zinfo)
+        self._zip.NameToInfo[zinfo.filename] = zinfo
+
+    def _compression_level_for(self, arcname):
+        return 0 if arcname.lower().endswith(PRECOMPRESSED_EXTENSIONS) else self.compression_level
+
+    def _compress(self, zinfo, source, level):
+        crc = 0
+        file_size = 0
+        output = tempfile.SpooledTemporaryFile(max_size=IN_MEMORY_LIMIT)
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15) if level else None
+        for chunk in iter(lambda: source.read(COPY_BUFFER_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            output.write(compressor.compress(chunk) if compressor else chunk)
+        if compressor:
+            output.write(compressor.flush())
+        zinfo.compress_type = zipfile.ZIP_DEFLATED if compressor else zipfile.ZIP_STORED
+        zinfo.CRC = crc & 0xffffffff
+        zinfo.file_size = file_size
+        zinfo.compress_size = output.tell()
+        output.seek(0)
+        return zinfo, output
+
+    def _reusable_entry(self, zinfo, file_size, level):
+        previous = self._previous_entries.get(zinfo.filename)
+        if previous is None or previous.flag_bits & 0x01:
+            return None
+        compress_type = zipfile.ZIP_DEFLATED if level else zipfile.ZIP_STORED
+        if (previous.file_size, previous.date_time, previous.external_attr, previous.compress_type) != \
+                (file_size, zinfo.date_time, zinfo.external_attr, compress_type):
+            return None
+        return previous
+
+    def _reuse(self, zinfo, previous):
+        # Compressed data is copied byte for byte, only the local header is read to find where it starts
+        with open(self._previous_path, 'rb') as previous_zip:
+            previous_zip.seek(previous.header_offset)
+            header = struct.unpack(zipfile.structFileHeader, previous_zip.read(zipfile.sizeFileHeader))
+        data_offset = previous.header_offset + zipfile.sizeFileHeader + \
+            header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH]
+        zinfo.compress_type = previous.compress_type
+        zinfo.CRC = previous.CRC
+        zinfo.file_size = previous.file_size
+        zinfo.compress_size = previous.compress_size
+        return zinfo, _FileRegion(self._previous_path, data_offset, previous.compress_size)
+
+    def _prepare_file(self, path, arcname):
+        st = os.stat(path)
+        zinfo = zipfile.ZipInfo(arcname, _date_time(st.st_mtime))
+        zinfo.external_attr = (st.st_mode & 0xFFFF) << 16L
+        level = self._compression_level_for(arcname)
+        previous = self._reusable_entry(zinfo, st.st_size, level)
+        # Files modified within the same 2 seconds keep their size and timestamp, so their content is compared too,
+        # reading a file is still much cheaper than compressing it
+        if previous is not None and _file_crc(path) == previous.CRC:
+            return self._reuse(zinfo, previous)
+        if not level and st.st_size > IN_MEMORY_LIMIT:
+            # Big stored entries are copied straight from the source file, without a temporary copy
+            zinfo.compress_type = zipfile.ZIP_STORED
+            zinfo.CRC = _file_crc(path)
+            zinfo.file_size = zinfo.compress_size = st.st_size
+            return zinfo, open(path, 'rb')
+        with open(path, 'rb') as source:
+            return self._compress(zinfo, source, level)
+
+    def _prepare_bytes(self, zinfo, data, level):
+        zinfo.CRC = zlib.crc32(data) & 0xffffffff
+        zinfo.file_size = len(data)
+        if level:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+            data = compressor.compress(data) + compressor.flush()
+        zinfo.compress_type = zipfile.ZIP_DEFLATED if level else zipfile.ZIP_STORED
+        zinfo.compress_size = len(data)
+        return zinfo, data
+
+    def add_file(self, path, arcname):
+        self._submit(self._prepare_file, path, arcname)
+
+    def add_bytes(self, arcname, data, mode=0644, date_time=None):
+        zinfo = zipfile.ZipInfo(arcname, date_time if date_time else _date_time(time.time()))
+        zinfo.external_attr = (0100000 | mode) << 16L
+        self._submit(self._prepare_bytes, zinfo, data, self._compression_level_for(arcname))
+
+    def add_stream(self, arcname, source, size, mode=0644, mtime=None):
+        # Sequential sources, like members of a tar stream, have to be read before the next entry is added
+        zinfo = zipfile.ZipInfo(arcname, _date_time(mtime if mtime is not None else time.time()))
+        zinfo.external_attr = (0100000 | mode) << 16L
+        level = self._compression_level_for(arcname)
+        if size <= IN_MEMORY_LIMIT:
+            self._submit(self._prepare_bytes, zinfo, source.read(), level)
+            return
+        # Big entries are compressed straight into the package, CRC and sizes follow them in a data descriptor
+        while self._pending:
+            self._write_finished(wait=True)
+        zip64 = size > zipfile.ZIP64_LIMIT / 2
+        zinfo.flag_bits |= DATA_DESCRIPTOR_FLAG
+        zinfo.CRC = 0
+        zinfo.file_size = zinfo.compress_size = size
+        zinfo.compress_type = zipfile.ZIP_DEFLATED if level else zipfile.ZIP_STORED
+        zinfo.header_offset = self._zip.fp.tell()
+        self._zip._writecheck(zinfo)
+        self._zip._didModify = True
+        header = zinfo.FileHeader(zip64)
+        self._zip.fp.write(header)
+        crc = 0
+        file_size = 0
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15) if level else None
+        for chunk in iter(lambda: source.read(COPY_BUFFER_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            self._zip.fp.write(compressor.compress(chunk) if compressor else chunk)
+        if compressor:
+            self._zip.fp.write(compressor.flush())
+        zinfo.CRC = crc & 0xffffffff
+        zinfo.file_size = file_size
+        zinfo.compress_size = self._zip.fp.tell() - zinfo.header_offset - len(header)
+        self._zip.fp.write(struct.pack('<4sLQQ' if zip64 else '<4sLLL', DATA_DESCRIPTOR_SIGNATURE,
+                                       zinfo.CRC, zinfo.compress_size, zinfo.file_size))
+        self._zip.filelist.append(zinfo)
+        self._zip.NameToInfo[zinfo.filename] = zinfo
+
+    def add_symlink(self, arcname, link_dest, mtime=None):
+        zinfo = zipfile.ZipInfo(arcname, _date_time(mtime if mtime is not None else time.time()))
+        zinfo.create_system = UNIX_SYSTEM
+        zinfo.external_attr = SYMLINK_ATTRIBUTES
+        self._submit(self._prepare_bytes, zinfo, link_dest, 0)
+
+    def close(self):
+        try:
+            while self._pending:
+                self._write_finished(wait=True)
+            self._zip.close()
+        except Exception:
+            self.abort()
+            raise
+        self._output.close()
+        self.sha256 = self._output.hexdigest()
+
+    def abort(self):
+        # Entries which are not compressed yet are dropped, the incomplete package is removed by its staging directory
+        while self._pending:
+            self._pending.popleft().cancel()
+        # Central directory is never written into the closed package
+        self._zip.fp = None
+        self._output.close()
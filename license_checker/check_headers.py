@@ -0,0 +1,183 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+
+from multiprocessing.pool import ThreadPool
+
+CHECKER_PATH = os.path.dirname(os.path.abspath(__file__))
+REPO_PATH = os.path.dirname(CHECKER_PATH)
+sys.path.insert(0, REPO_PATH)
+
+from lib.logger import LOGGER
+
+# Same configuration as license_checker.xml
+HEADER_FILES = ('license_header_2015.txt', 'license_header_2016.txt')
+INCLUDES = ('**/*.sh', '**/*.py', '*.sh')
+# Default excludes of license-maven-plugin which can match shell and python files
+DEFAULT_EXCLUDES = ('**/*~', '**/#*#', '**/.#*', '**/%*%', '**/._*', '**/.repository/**', '**/CVS/**', '**/RCS/**',
+                    '**/SCCS/**', '**/.svn/**', '**/.arch-ids/**', '**/.bzr/**', '**/.hg/**', '**/.git/**',
+                    '**/BitKeeper/**', '**/ChangeSet/**', '**/_darcs/**', '**/.darcsrepo/**', '**/.metadata/**',
+                    '**/.settings/**', '**/.clover/**', '**/target/**', '**/test-output/**', '.idea/**')
+# Script style comments, as mapped for py and sh files in license_checker.xml
+COMMENT_PREFIX = '#'
+# Header is looked for in its own number of lines plus this many, after shebang line and anything else above it
+EXTRA_HEADER_LINES = 10
+MAX_HEADER_BYTES = 16 * 1024
+DEFAULT_CACHE_PATH = os.path.join(CHECKER_PATH, '.header_check_cache.json')
+
+
+def ant_pattern(pattern):
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == len(pattern):
+            regex += '(?:/.*)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return re.compile(regex + '$')
+
+
+def one_line(text):
+    # The plugin compares headers without comment characters and whitespace, so reformatted headers still match
+    return re.sub(r'\s+', '', text.replace(COMMENT_PREFIX, ''))
+
+
+def load_headers():
+    headers = []
+    for header_file in HEADER_FILES:
+        with open(os.path.join(CHECKER_PATH, header_file), 'r') as header:
+            content = header.read()
+        headers.append((one_line(content), len(content.strip().splitlines()) + 2))
+    return headers
+
+
+def find_files(base_path, excludes):
+    includes = [ant_pattern(pattern) for pattern in INCLUDES]
+    excludes = [ant_pattern(pattern) for pattern in excludes]
+    # Excluded directories are not walked at all
+    excluded_dirs = [ant_pattern(pattern.pattern[:-len('(?:/.*)?$')]) for pattern in excludes
+                     if pattern.pattern.endswith('(?:/.*)?$')]
+    files = []
+    for root, dirs, names in os.walk(base_path):
+        rel_root = os.path.relpath(root, base_path)
+        rel_root = '' if rel_root == '.' else rel_root + '/'
+        dirs[:] = sorted(name for name in dirs if not any(pattern.match(rel_root + name) for pattern in excluded_dirs))
+        for name in sorted(names):
+            path = rel_root + name
+            if any(pattern.match(path) for pattern in includes) and not any(pattern.match(path) for pattern in excludes):
+                files.append(path)
+    return files
+
+
+def read_header_bytes(path, lines_count):
+    lines = []
+    with open(path, 'rb') as source:
+        while len(lines) < lines_count:
+            line = source.readline(MAX_HEADER_BYTES)
+            if not line:
+                break
+            lines.append(line)
+    return ''.join(lines)
+
+
+def check_file(path, headers, cached):
+    stat = os.stat(path)
+    if cached and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime:
+        return cached
+    head = read_header_bytes(path, max(lines_count for header, lines_count in headers) + EXTRA_HEADER_LINES)
+    digest = hashlib.sha1(head).hexdigest()
+    if cached and cached['sha1'] == digest:
+        valid = cached['valid']
+    else:
+        head_one_line = one_line(head)
+        valid = any(header in head_one_line for header, lines_count in headers)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': digest, 'valid': valid}
+
+
+def load_cache(cache_path, headers_key):
+    try:
+        with open(cache_path, 'r') as cache_file:
+            cache = json.load(cache_file)
+        # Results are valid only for the headers they were checked against
+        return cache['files'] if cache.get('headers') == headers_key else {}
+    except (IOError, ValueError, KeyError):
+        return {}
+
+
+def save_cache(cache_path, headers_key, files):
+    with open(cache_path + '.tmp', 'w') as cache_file:
+        json.dump({'headers': headers_key, 'files': files}, cache_file)
+    os.rename(cache_path + '.tmp', cache_path)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Checks license headers of shell and python files, like license:check '
+                                                 'goal configured in license_checker.xml.')
+    parser.add_argument('--basedir', default=REPO_PATH, help='Directory to check (platform-parent directory by default).')
+    parser.add_argument('-e', '--exclude', nargs='+', default=[], help='Additional Ant-style patterns of excluded files.')
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help='Path to file with results of previous checks.')
+    parser.add_argument('--no-cache', action='store_true', help='Checks all files, without reading or writing cache.')
+    parser.add_argument('-j', '--jobs', type=int, default=8, help='Number of files checked in parallel.')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    headers = load_headers()
+    headers_key = hashlib.sha1(json.dumps(headers)).hexdigest()
+    cache = {} if args.no_cache else load_cache(args.cache, headers_key)
+
+    paths = find_files(args.basedir, DEFAULT_EXCLUDES + tuple(args.exclude))
+    pool = ThreadPool(max(1, args.jobs))
+    try:
+        results = pool.map(lambda path: check_file(os.path.join(args.basedir, path), headers,
+                                                   cache.get(path)), paths)
+    finally:
+        pool.close()
+
+    missing = [path for path, result in zip(paths, results) if not result['valid']]
+    for path in missing:
+        LOGGER.error('Missing header in: %s', path)
+    if not args.no_cache:
+        save_cache(args.cache, headers_key, dict(zip(paths, results)))
+    LOGGER.info('Checked %s files, %s without header', len(paths), len(missing))
+    # Exit codes are the same as of mvn license:check
+    sys.exit(1 if missing else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,5 +14,5 @@
 # limitations under the License.
 #
 
-mvn -f license_checker/license_checker.xml license:check
+python "$(dirname "$0")/check_headers.py" "$@"
 exit $?
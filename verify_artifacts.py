@@ -0,0 +1,68 @@
+#
+# Copyright (c) 2016 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import sys
+import argparse
+import builders.constants as constants
+
+from multiprocessing.pool import ThreadPool
+from lib.logger import LOGGER
+from lib.manifest import OK
+from lib.manifest import UNCHANGED
+from lib.manifest import load_manifest
+from lib.manifest import verify_artifact
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Verifies packages in destination directory against their manifest.')
+    parser.add_argument('-d', '--destination', required=False, help='Destination path with zip packages.')
+    parser.add_argument('--full', action='store_true', help='Checks digests of all files, even if their size and '
+                                                            'modification time have not changed.')
+    parser.add_argument('-j', '--jobs', type=int, default=constants.CPU_CORES_COUNT, help='Number of files checked in parallel.')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    destination_path = args.destination if args.destination else constants.DEFAULT_DESTINATION_PATH
+    try:
+        artifacts = load_manifest(destination_path)
+    except (IOError, ValueError, KeyError) as e:
+        LOGGER.error('Cannot read manifest in %s: %s', destination_path, e)
+        sys.exit(2)
+
+    paths = sorted(artifacts)
+    pool = ThreadPool(max(1, args.jobs))
+    try:
+        results = pool.map(lambda path: verify_artifact(destination_path, path, artifacts[path], args.full), paths)
+    finally:
+        pool.close()
+
+    failures = 0
+    for path, result in zip(paths, results):
+        if result in (OK, UNCHANGED):
+            LOGGER.debug('%s: %s', path, result)
+        else:
+            LOGGER.error('%s: %s', path, result)
+            failures += 1
+    LOGGER.info('Verified %s files: %s hashed, %s unchanged, %s failed', len(paths), results.count(OK),
+                results.count(UNCHANGED), failures)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()